@@ -5,7 +5,7 @@ Communcation with Arduino board using USB.
 @contact: http://www.haw-hamburg.de/marc-hensel
 
 @copyright: 2023, Marc Hensel
-@version: 2023.12.12
+@version: 2024.10.19
 @license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
 """
 
@@ -110,24 +110,58 @@ class ArduinoCOM():
     # Read/write data
     # ----------------------------------------------------------------------
     
-    def readLine(self):
+    def readLine(self, timeoutSec=None):
         """
         Read line (i.e., until new line symbol included) from serial port.
 
+        If no complete line is received in time, any received data is
+        discarded, so that a late reply is not read as reply to a later
+        request.
+
+        Parameters
+        ----------
+        timeoutSec : float, optional
+            Maximum time in [s] to wait for the line. Uses the connection's
+            read timeout, if None. (Default: None)
+
         Returns
         -------
         string
-            Data read from port (8-bit Unicode, without new line symbol) or None.
+            Data read from port (8-bit Unicode, without new line symbol) or
+            None, if no complete line has been received.
 
         """
         if self._serial != None:
-            data = self._serial.readline()
-            if data:
+            if timeoutSec == None:
+                data = self._serial.readline()
+            else:
+                defaultTimeoutSec = self._serial.timeout
+                self._serial.timeout = timeoutSec
+                try:
+                    data = self._serial.readline()
+                finally:
+                    self._serial.timeout = defaultTimeoutSec
+            if data.endswith(b'\n'):
                 return str(data, 'utf-8').rstrip('\n')
+            self._serial.reset_input_buffer()
         return None
 
     # ----------------------------------------------------------------------
 
+    def resetInput(self):
+        """
+        Discard data received, but not read yet (e.g., replies received late).
+
+        Returns
+        -------
+        None.
+
+        """
+        if self._serial != None:
+            self._serial.reset_input_buffer()
+
+    # ----------------------------------------------------------------------
+
     def writeString(self, data):
         """
         Send string data to a connected Arduino.
@@ -0,0 +1,459 @@
+"""
+Quality check of a hexaphonic pickup based on a multichannel test recording.
+
+The recording is a WAV file with one channel per string (e.g., recorded with
+the USB audio interface), in which the open strings are plucked one after
+another. It is read in chunks, and all measures are computed for all channels
+at once using NumPy:
+
+- Output level (RMS and peak) of each coil
+- Averaged power spectrum of each coil, summarized as octave band levels
+- Crosstalk between strings (coupling of each channel into the others)
+- Pitch of each channel (YIN), compared to the open string's frequency
+
+The results can be related to the coils' winding parameters as logged by
+WinderApp.
+
+@author: Marc Hensel
+@contact: http://www.haw-hamburg.de/marc-hensel
+@copyright: 2024
+@version: 2024.10.19
+@license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
+"""
+import sys
+import csv
+import wave
+import numpy as np
+
+class CoilQA():
+
+    # =========================================================================
+    # ========== Class constants ==============================================
+    # =========================================================================
+
+    # Frequencies [Hz] of open strings in standard tuning (string 1 = high E)
+    _openStringsHz = [329.63, 246.94, 196.00, 146.83, 110.00, 82.41]
+
+    # Center frequencies [Hz] of octave bands summarizing the spectrum
+    _octaveBandsHz = [63, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]
+
+    # =========================================================================
+    # ========== Constructor ==================================================
+    # =========================================================================
+
+    def __init__(self, openStringsHz=None, frameSize=4096, chunkFrames=16, yinThreshold=0.15,
+                 minLevelDb=-50.0, maxLevelDeviationDb=3.0, maxCrosstalkDb=-20.0, maxPitchDeviationCents=50.0):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        openStringsHz : list of float, optional
+            Expected frequency [Hz] per channel. Standard tuning with channel
+            0 being the high E string, if None. (Default: None)
+        frameSize : int, optional
+            Samples per frame for spectrum and pitch detection. (Default: 4096)
+        chunkFrames : int, optional
+            Frames read from the file and processed at once. (Default: 16)
+        yinThreshold : float, optional
+            Threshold of the YIN algorithm's normalized difference function. (Default: 0.15)
+        minLevelDb : float, optional
+            Frames with lower RMS level [dBFS] are not used for pitch detection. (Default: -50.0)
+        maxLevelDeviationDb : float, optional
+            Maximum deviation of a channel's level from the median of all channels [dB]. (Default: 3.0)
+        maxCrosstalkDb : float, optional
+            Maximum coupling of a channel into any other channel [dB]. (Default: -20.0)
+        maxPitchDeviationCents : float, optional
+            Maximum deviation of the detected from the expected pitch [cents]. (Default: 50.0)
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__openStringsHz = np.array(openStringsHz if openStringsHz is not None else self._openStringsHz)
+        self.__frameSize = frameSize
+        self.__chunkFrames = chunkFrames
+        self.__yinThreshold = yinThreshold
+        self.__minLevelDb = minLevelDb
+        self.__maxLevelDeviationDb = maxLevelDeviationDb
+        self.__maxCrosstalkDb = maxCrosstalkDb
+        self.__maxPitchDeviationCents = maxPitchDeviationCents
+        self.__window = np.hanning(frameSize)[np.newaxis, :, np.newaxis]
+
+    # =========================================================================
+    # ========== Analysis =====================================================
+    # =========================================================================
+
+    def analyze(self, wavFile):
+        """
+        Analyze a multichannel test recording.
+
+        Parameters
+        ----------
+        wavFile : string
+            Path of a PCM WAV file (8, 16, 24, or 32 bit) with one channel per string.
+
+        Returns
+        -------
+        dict
+            Measures per channel (arrays with one entry per channel):
+            'levelDb' (RMS level [dBFS]), 'peakDb' (peak level [dBFS]),
+            'bandsHz' and 'bandLevelsDb' (octave bands x channels [dBFS]),
+            'crosstalkDb' (channels x channels, [i, j] being the level of
+            channel j relative to channel i in frames dominated by channel
+            i [dB]), 'pitchHz' (median pitch of voiced frames dominated
+            by the channel [Hz] or NaN), 'pitchDeviationCents', and
+            'sampleRate' [Hz].
+
+        """
+        with wave.open(wavFile, 'rb') as wav:
+            sampleRate = wav.getframerate()
+            numberChannels = wav.getnchannels()
+            sampleWidth = wav.getsampwidth()
+            if numberChannels != len(self.__openStringsHz):
+                raise ValueError('Expected {} channels, but file has {}'.format(len(self.__openStringsHz), numberChannels))
+
+            # Running sums
+            numberSamples = 0
+            peak = np.zeros(numberChannels)
+            sumSquares = np.zeros(numberChannels)
+            dominantEnergy = np.zeros((numberChannels, numberChannels))
+            powerSum = np.zeros((self.__frameSize // 2 + 1, numberChannels))
+            numberFrames = 0
+            pitches = []
+
+            # Process file in chunks of full frames (remaining samples carried over)
+            carry = np.zeros((0, numberChannels))
+            chunkSize = self.__frameSize * self.__chunkFrames
+            while True:
+                data = wav.readframes(chunkSize)
+                if len(data) == 0:
+                    break
+                samples = np.concatenate((carry, self.__decode(data, sampleWidth, numberChannels)))
+
+                # Level uses all samples
+                newSamples = samples[len(carry):]
+                numberSamples += len(newSamples)
+                peak = np.maximum(peak, np.max(np.abs(newSamples), axis=0))
+                sumSquares += np.sum(newSamples ** 2, axis=0)
+
+                # Spectrum and pitch use full frames (frames x samples x channels)
+                count = len(samples) // self.__frameSize
+                frames = samples[:count * self.__frameSize].reshape(count, self.__frameSize, numberChannels)
+                carry = samples[count * self.__frameSize:]
+                if count > 0:
+                    spectra = np.fft.rfft(frames * self.__window, axis=1)
+                    powerSum += np.sum(np.abs(spectra) ** 2, axis=0)
+                    numberFrames += count
+
+                    # Crosstalk: Energy of all channels in frames dominated by one channel
+                    energy = np.sum(frames ** 2, axis=1)
+                    dominant = np.argmax(energy, axis=1)
+                    isLoud = 10.0 * np.log10(np.maximum(np.max(energy, axis=1) / self.__frameSize, 1e-20)) >= self.__minLevelDb
+                    np.add.at(dominantEnergy, dominant[isLoud], energy[isLoud])
+
+                    # Pitch only in frames dominated by the channel (not picked up by crosstalk)
+                    framePitches = self.__detectPitch(frames, sampleRate)
+                    isDominant = (np.arange(numberChannels)[np.newaxis, :] == dominant[:, np.newaxis])
+                    framePitches[~isDominant] = np.nan
+                    pitches.append(framePitches)
+
+        if numberSamples == 0:
+            raise ValueError('No samples in file {}'.format(wavFile))
+
+        # Level
+        meanSquare = sumSquares / numberSamples
+        levelDb = 10.0 * np.log10(np.maximum(meanSquare, 1e-20))
+        peakDb = 20.0 * np.log10(np.maximum(peak, 1e-10))
+
+        # Crosstalk relative to dominating channel (-200 dB if channel never dominates)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = dominantEnergy / np.diag(dominantEnergy)[:, np.newaxis]
+        crosstalkDb = 10.0 * np.log10(np.maximum(np.nan_to_num(ratio), 1e-20))
+        np.fill_diagonal(crosstalkDb, 0.0)
+
+        # Octave band levels of averaged power spectrum (mean square per bin,
+        # so that band levels use the same dBFS reference as levelDb)
+        bandsHz = np.array([f for f in self._octaveBandsHz if f * np.sqrt(2) <= sampleRate / 2])
+        bandLevelsDb = np.full((len(bandsHz), numberChannels), -200.0)
+        if numberFrames > 0:
+            power = powerSum / numberFrames / (self.__frameSize * np.sum(self.__window ** 2))
+            power[1:(self.__frameSize + 1) // 2] *= 2      # One-sided spectrum (except DC and Nyquist bin)
+            binsHz = np.fft.rfftfreq(self.__frameSize, d=1.0 / sampleRate)
+            for index, centerHz in enumerate(bandsHz):
+                isInBand = (binsHz >= centerHz / np.sqrt(2)) & (binsHz < centerHz * np.sqrt(2))
+                bandLevelsDb[index] = 10.0 * np.log10(np.maximum(np.sum(power[isInBand], axis=0), 1e-20))
+
+        # Pitch as median of voiced frames
+        pitchHz = np.full(numberChannels, np.nan)
+        if len(pitches) > 0:
+            pitches = np.concatenate(pitches)
+            isVoiced = np.any(~np.isnan(pitches), axis=0)
+            pitchHz[isVoiced] = np.nanmedian(pitches[:, isVoiced], axis=0)
+        pitchDeviationCents = 1200.0 * np.log2(pitchHz / self.__openStringsHz)
+
+        return {
+            'sampleRate': sampleRate,
+            'levelDb': levelDb,
+            'peakDb': peakDb,
+            'bandsHz': bandsHz,
+            'bandLevelsDb': bandLevelsDb,
+            'crosstalkDb': crosstalkDb,
+            'pitchHz': pitchHz,
+            'pitchDeviationCents': pitchDeviationCents
+        }
+
+    # -------------------------------------------------------------------------
+
+    def grade(self, results):
+        """
+        Check the measures of each channel against the limits.
+
+        Parameters
+        ----------
+        results : dict
+            Measures as returned by analyze().
+
+        Returns
+        -------
+        dict
+            Boolean arrays with one entry per channel: 'isLevelOk' (level
+            close to median of all channels), 'isCrosstalkOk' (coupling into
+            other channels below limit), 'isPitchOk' (pitch detected and
+            close to expected pitch), and 'isOk' (all checks passed).
+
+        """
+        levelDeviationDb = results['levelDb'] - np.median(results['levelDb'])
+        isLevelOk = np.abs(levelDeviationDb) <= self.__maxLevelDeviationDb
+        isCrosstalkOk = self.__maxCrosstalk(results['crosstalkDb']) <= self.__maxCrosstalkDb
+        with np.errstate(invalid='ignore'):
+            isPitchOk = np.abs(results['pitchDeviationCents']) <= self.__maxPitchDeviationCents
+
+        return {
+            'isLevelOk': isLevelOk,
+            'isCrosstalkOk': isCrosstalkOk,
+            'isPitchOk': isPitchOk,
+            'isOk': isLevelOk & isCrosstalkOk & isPitchOk
+        }
+
+    # -------------------------------------------------------------------------
+
+    def __maxCrosstalk(self, crosstalkDb):
+        """
+        Get the strongest coupling of each channel into any other channel.
+
+        Parameters
+        ----------
+        crosstalkDb : numpy.ndarray
+            Crosstalk matrix as returned by analyze() [dB].
+
+        Returns
+        -------
+        numpy.ndarray
+            Maximum crosstalk per channel [dB].
+
+        """
+        offDiagonal = crosstalkDb - 200.0 * np.eye(len(crosstalkDb))
+        return np.max(offDiagonal, axis=1)
+
+    # =========================================================================
+    # ========== Signal processing ============================================
+    # =========================================================================
+
+    def __decode(self, data, sampleWidth, numberChannels):
+        """
+        Convert PCM data read from a WAV file to floats in [-1, 1].
+
+        Parameters
+        ----------
+        data : bytes
+            Interleaved little-endian PCM samples.
+        sampleWidth : int
+            Bytes per sample (1 to 4).
+        numberChannels : int
+            Number of channels.
+
+        Returns
+        -------
+        numpy.ndarray
+            Samples (samples x channels).
+
+        """
+        if sampleWidth == 1:
+            samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float64) - 128.0) / 128.0
+        elif sampleWidth == 2:
+            samples = np.frombuffer(data, dtype='<i2') / 32768.0
+        elif sampleWidth == 3:
+            bytes3 = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            values = bytes3[:, 0] | (bytes3[:, 1] << 8) | (bytes3[:, 2] << 16)
+            values = np.where(values >= (1 << 23), values - (1 << 24), values)
+            samples = values / float(1 << 23)
+        elif sampleWidth == 4:
+            samples = np.frombuffer(data, dtype='<i4') / float(1 << 31)
+        else:
+            raise ValueError('Unsupported sample width: {} bytes'.format(sampleWidth))
+        return samples.reshape(-1, numberChannels)
+
+    # -------------------------------------------------------------------------
+
+    def __detectPitch(self, frames, sampleRate, minHz=60.0, maxHz=1000.0):
+        """
+        Detect the pitch of all frames and channels using the YIN algorithm.
+
+        Parameters
+        ----------
+        frames : numpy.ndarray
+            Samples (frames x samples x channels).
+        sampleRate : int
+            Sample rate [Hz].
+        minHz : float, optional
+            Lowest pitch to detect [Hz]. (Default: 60.0)
+        maxHz : float, optional
+            Highest pitch to detect [Hz]. (Default: 1000.0)
+
+        Returns
+        -------
+        numpy.ndarray
+            Pitch [Hz] (frames x channels), NaN for silent or unvoiced frames.
+
+        """
+        size = frames.shape[1]
+        width = size // 2
+        minLag = max(2, int(sampleRate / maxHz))
+        maxLag = min(width - 2, int(sampleRate / minHz))
+
+        # Difference function d(tau) = E(0) + E(tau) - 2 r(tau) using FFT autocorrelation
+        fftSize = 2 * size
+        spectrumHead = np.fft.rfft(frames[:, :width], n=fftSize, axis=1)
+        spectrumFull = np.fft.rfft(frames, n=fftSize, axis=1)
+        correlation = np.fft.irfft(np.conj(spectrumHead) * spectrumFull, n=fftSize, axis=1)[:, :width]
+        cumulativeEnergy = np.concatenate((np.zeros_like(frames[:, :1]), np.cumsum(frames ** 2, axis=1)), axis=1)
+        energy = cumulativeEnergy[:, width:width + width] - cumulativeEnergy[:, :width]
+        difference = energy[:, :1] + energy - 2.0 * correlation
+        difference[:, 0] = 0.0
+
+        # Cumulative mean normalized difference
+        lags = np.arange(width)[np.newaxis, :, np.newaxis]
+        cumulativeDifference = np.cumsum(difference, axis=1)
+        normalized = np.ones_like(difference)
+        normalized[:, 1:] = difference[:, 1:] * lags[:, 1:] / np.maximum(cumulativeDifference[:, 1:], 1e-20)
+
+        # First local minimum below threshold in lag range
+        search = normalized[:, minLag:maxLag + 1]
+        isCandidate = (search[:, 1:-1] < self.__yinThreshold) & (search[:, 1:-1] <= search[:, :-2]) & (search[:, 1:-1] <= search[:, 2:])
+        isVoiced = np.any(isCandidate, axis=1)
+        lag = np.argmax(isCandidate, axis=1) + minLag + 1
+
+        # Parabolic interpolation around the minimum
+        left = np.take_along_axis(normalized, (lag - 1)[:, np.newaxis, :], axis=1)[:, 0]
+        center = np.take_along_axis(normalized, lag[:, np.newaxis, :], axis=1)[:, 0]
+        right = np.take_along_axis(normalized, (lag + 1)[:, np.newaxis, :], axis=1)[:, 0]
+        curvature = left - 2.0 * center + right
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shift = np.where(curvature > 0.0, 0.5 * (left - right) / curvature, 0.0)
+        pitchHz = sampleRate / (lag + shift)
+
+        # Discard unvoiced and silent frames
+        levelDb = 10.0 * np.log10(np.maximum(np.mean(frames ** 2, axis=1), 1e-20))
+        pitchHz[~isVoiced | (levelDb < self.__minLevelDb)] = np.nan
+        return pitchHz
+
+    # =========================================================================
+    # ========== Coil log and report ==========================================
+    # =========================================================================
+
+    def loadCoilLog(self, coilLogFile, pickup=None):
+        """
+        Load the winding parameters of the coils of the tested pickup.
+
+        Coils are joined to channels by the pickup and string number logged
+        by WinderApp (string 1 being channel 0). If a string has been logged
+        several times (e.g., an aborted coil has been rewound), the latest
+        entry is used.
+
+        Parameters
+        ----------
+        coilLogFile : string
+            Path of the CSV coil log.
+        pickup : int, optional
+            Number of the tested pickup. Uses the pickup of the latest entry,
+            if None. (Default: None)
+
+        Returns
+        -------
+        list of dict
+            Winding parameters per channel (None for channels without coil entry).
+
+        """
+        with open(coilLogFile, newline='') as file:
+            rows = list(csv.DictReader(file))
+        if len(rows) == 0:
+            return [None] * len(self.__openStringsHz)
+        if pickup == None:
+            pickup = int(rows[-1]['pickup'])
+
+        # Latest entry per string of the pickup
+        coils = [None] * len(self.__openStringsHz)
+        for row in rows:
+            channel = int(row['string']) - 1
+            if (int(row['pickup']) == pickup) and (0 <= channel < len(coils)):
+                coils[channel] = row
+        return coils
+
+    # -------------------------------------------------------------------------
+
+    def printReport(self, results, grades, coils=None):
+        """
+        Print the measures and checks per channel.
+
+        Parameters
+        ----------
+        results : dict
+            Measures as returned by analyze().
+        grades : dict
+            Checks as returned by grade().
+        coils : list of dict, optional
+            Winding parameters per channel as returned by loadCoilLog(). (Default: None)
+
+        Returns
+        -------
+        None.
+
+        """
+        crosstalkDb = self.__maxCrosstalk(results['crosstalkDb'])
+        print('String  Turns  Level [dBFS]  Peak [dBFS]  Crosstalk [dB]  Pitch [Hz]  Deviation [cents]  Result')
+        for channel in range(len(results['levelDb'])):
+            coil = coils[channel] if (coils != None) and (coils[channel] != None) else {}
+            print('{:6d}  {:>5}  {:12.1f}  {:11.1f}  {:14.1f}  {:10.1f}  {:17.1f}  {}'.format(
+                channel + 1,
+                coil.get('turns', '-'),
+                results['levelDb'][channel],
+                results['peakDb'][channel],
+                crosstalkDb[channel],
+                results['pitchHz'][channel],
+                results['pitchDeviationCents'][channel],
+                'ok' if grades['isOk'][channel] else 'FAILED ({})'.format(' '.join(
+                    [check for check, isOk in [('level', grades['isLevelOk'][channel]),
+                                               ('crosstalk', grades['isCrosstalkOk'][channel]),
+                                               ('pitch', grades['isPitchOk'][channel])] if not isOk]))))
+
+        print('\nOctave band levels [dBFS]')
+        print('Band [Hz]' + ''.join(['  String {}'.format(channel + 1) for channel in range(len(results['levelDb']))]))
+        for index, centerHz in enumerate(results['bandsHz']):
+            print('{:9d}'.format(int(centerHz)) + ''.join(['{:10.1f}'.format(value) for value in results['bandLevelsDb'][index]]))
+
+# -----------------------------------------------------------------------------
+# Main (sample)
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python CoilQA.py recording.wav [coils.csv [pickup]]')
+        sys.exit()
+
+    qa = CoilQA()
+    results = qa.analyze(sys.argv[1])
+    pickup = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    coils = qa.loadCoilLog(sys.argv[2], pickup) if len(sys.argv) > 2 else None
+    qa.printReport(results, qa.grade(results), coils)
@@ -0,0 +1,184 @@
+"""
+Lock-free command queue in shared memory from one sending to one receiving process.
+
+@author: Marc Hensel
+@contact: http://www.haw-hamburg.de/marc-hensel
+@copyright: 2024
+@version: 2024.10.19
+@license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
+"""
+import os
+import struct
+import tempfile
+from SharedBlock import SharedBlock
+
+# Exclusive file locks (claim of the sender)
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+class CommandQueue(SharedBlock):
+
+    # =========================================================================
+    # ========== Class constants ==============================================
+    # =========================================================================
+
+    _headerFormat = '<QQ'       # Write index (sender), read index (receiver)
+    _slotFormat = '<c3xi'       # Command char, padding, value
+
+    # =========================================================================
+    # ========== Constructor ==================================================
+    # =========================================================================
+
+    def __init__(self, name, isCreate=False, capacity=64):
+        """
+        Constructor.
+
+        The queue is a ring buffer of fixed-size slots. Only the sender
+        writes the write index, and only the receiver writes the read index.
+        An index is updated after the slot has been written or read, so that
+        neither side needs a lock. This requires that at most one process
+        sends commands at a time, which a sender ensures by claim().
+
+        Parameters
+        ----------
+        name : string
+            System-wide name of the shared memory.
+        isCreate : bool, optional
+            Create the shared memory (receiver) if True, else attach to it (sender). (Default: False)
+        capacity : int, optional
+            Maximum number of pending commands (must match the receiver's value). (Default: 64)
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__capacity = capacity
+        self.__headerSize = struct.calcsize(self._headerFormat)
+        self.__slotSize = struct.calcsize(self._slotFormat)
+        self.__lockPath = os.path.join(tempfile.gettempdir(), name + '.lock')
+        self.__lockFile = None
+        super().__init__(name, self.__headerSize + capacity * self.__slotSize, isCreate)
+
+    # =========================================================================
+    # ========== Sender ownership =============================================
+    # =========================================================================
+
+    def claim(self):
+        """
+        Claim the queue as its only sender.
+
+        The claim is an exclusive, non-blocking lock on a lock file named
+        after the queue. The operating system grants it to one open file
+        only (i.e., also refuses a second claim from the same process) and
+        releases it when the process terminates.
+
+        Returns
+        -------
+        bool
+            True if the queue has been claimed (or had already been claimed
+            by this object), False if it is claimed by another sender.
+
+        """
+        if self.__lockFile != None:
+            return True
+
+        lockFile = open(self.__lockPath, 'a+b')
+        try:
+            if os.name == 'nt':
+                lockFile.seek(0)
+                msvcrt.locking(lockFile.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lockFile.close()
+            return False
+        self.__lockFile = lockFile
+        return True
+
+    # -------------------------------------------------------------------------
+
+    def release(self):
+        """
+        Release the claim, if claimed by this object.
+
+        Returns
+        -------
+        None.
+
+        """
+        if self.__lockFile != None:
+            if os.name == 'nt':
+                self.__lockFile.seek(0)
+                msvcrt.locking(self.__lockFile.fileno(), msvcrt.LK_UNLCK, 1)
+            self.__lockFile.close()         # Closing releases flock()
+            self.__lockFile = None
+
+    # -------------------------------------------------------------------------
+
+    def close(self):
+        """
+        Release the claim and detach from or remove the shared memory.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.release()
+        super().close()
+
+    # =========================================================================
+    # ========== Send/receive commands ========================================
+    # =========================================================================
+
+    def put(self, command, value=0):
+        """
+        Send a command (sender only).
+
+        Parameters
+        ----------
+        command : string
+            Command char.
+        value : int, optional
+            Command argument. (Default: 0)
+
+        Returns
+        -------
+        bool
+            True if the command has been queued, False if the queue is full.
+
+        """
+        writeIndex, readIndex = struct.unpack_from(self._headerFormat, self._buffer, 0)
+        if writeIndex - readIndex >= self.__capacity:
+            return False
+
+        # Write slot, then publish it by incrementing the write index
+        offset = self.__headerSize + (writeIndex % self.__capacity) * self.__slotSize
+        struct.pack_into(self._slotFormat, self._buffer, offset, command.encode('ascii'), int(value))
+        struct.pack_into('<Q', self._buffer, 0, writeIndex + 1)
+        return True
+
+    # -------------------------------------------------------------------------
+
+    def get(self):
+        """
+        Receive the next command (receiver only).
+
+        Returns
+        -------
+        tuple
+            Command char and value (command, value), or None if the queue is empty.
+
+        """
+        writeIndex, readIndex = struct.unpack_from(self._headerFormat, self._buffer, 0)
+        if readIndex >= writeIndex:
+            return None
+
+        # Read slot, then release it by incrementing the read index
+        offset = self.__headerSize + (readIndex % self.__capacity) * self.__slotSize
+        command, value = struct.unpack_from(self._slotFormat, self._buffer, offset)
+        struct.pack_into('<Q', self._buffer, 8, readIndex + 1)
+        return (command.decode('ascii'), value)
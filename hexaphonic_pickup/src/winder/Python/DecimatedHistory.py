@@ -0,0 +1,203 @@
+"""
+Min/max decimated history of a time series for plotting long sessions.
+
+@author: Marc Hensel
+@contact: http://www.haw-hamburg.de/marc-hensel
+@copyright: 2024
+@version: 2024.10.19
+@license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
+"""
+from collections import deque
+
+class DecimatedHistory():
+
+    # =========================================================================
+    # ========== Constructor ==================================================
+    # =========================================================================
+
+    def __init__(self, capacity=1024, numberLevels=16, factor=2):
+        """
+        Constructor.
+
+        The history is stored in levels of decreasing time resolution. Level 0
+        contains the raw samples, each entry of level k+1 aggregates 'factor'
+        entries of level k into their minimum and maximum. Each level holds
+        at most 'capacity' entries, so that memory and the cost of querying a
+        time span are bounded independent of the session length.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            Maximum number of entries per level. (Default: 1024)
+        numberLevels : int, optional
+            Number of levels including raw samples. (Default: 16)
+        factor : int, optional
+            Number of entries of a level aggregated into one entry of the next level. (Default: 2)
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__capacity = capacity
+        self.__factor = factor
+        self.__levels = [deque(maxlen=capacity) for _ in range(numberLevels)]
+        self.__pending = [None] * numberLevels     # Partial aggregates [t, min, max, count] per level
+
+    # =========================================================================
+    # ========== Add and query data ===========================================
+    # =========================================================================
+
+    def append(self, t, value):
+        """
+        Append a sample. Amortized cost per sample is constant.
+
+        Parameters
+        ----------
+        t : float
+            Sample time [s] (must not be smaller than the previous sample's time).
+        value : float
+            Sample value.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__push(0, t, value, value)
+
+    # -------------------------------------------------------------------------
+
+    def getLast(self):
+        """
+        Get the most recent raw sample.
+
+        Returns
+        -------
+        tuple
+            Sample (t, value) or None, if the history is empty.
+
+        """
+        if len(self.__levels[0]) == 0:
+            return None
+        t, value, _ = self.__levels[0][-1]
+        return (t, value)
+
+    # -------------------------------------------------------------------------
+
+    def getSpan(self, tStart, maxPoints=512):
+        """
+        Get the history from a start time on at a resolution suited for plotting.
+
+        Selects the finest level covering the time span with at most
+        'maxPoints' entries. The partial aggregates of the most recent samples
+        (i.e., not yet contained in the level) are appended as one entry at
+        the latest sample's time, so that the span always ends at the latest
+        sample. Each entry is returned as pair of points (t, min) and
+        (t, max), so that a line through the points shows the min/max
+        envelope of the signal.
+
+        Parameters
+        ----------
+        tStart : float
+            Start time [s] of the span to return.
+        maxPoints : int, optional
+            Maximum number of entries to return. (Default: 512)
+
+        Returns
+        -------
+        times : list of float
+            Time of each point.
+        values : list of float
+            Value of each point (alternating min and max of an entry).
+
+        """
+        selected = []
+        for levelIndex, level in enumerate(self.__levels):
+            if len(level) == 0:
+                break
+            entries = [entry for entry in level if entry[0] >= tStart]
+            tail = self.__getPendingTail(levelIndex)
+            if (tail != None) and (tail[0] >= tStart):
+                entries.append((self.__levels[0][-1][0], tail[1], tail[2]))
+            isComplete = (len(level) < self.__capacity) or (level[0][0] <= tStart)
+            selected = entries
+            if isComplete and (len(entries) <= maxPoints):
+                break
+
+        # Interleave minimum and maximum of each entry
+        times, values = [], []
+        for t, yMin, yMax in selected:
+            times += [t, t]
+            values += [yMin, yMax]
+        return times, values
+
+    # =========================================================================
+    # ========== Decimation ===================================================
+    # =========================================================================
+
+    def __getPendingTail(self, levelIndex):
+        """
+        Merge the partial aggregates of all levels up to a level.
+
+        Parameters
+        ----------
+        levelIndex : int
+            Index of the level.
+
+        Returns
+        -------
+        tuple
+            Entry (t, min, max) of all samples not yet contained in the level,
+            or None if there are no such samples.
+
+        """
+        tail = None
+        for pending in self.__pending[1:levelIndex + 1]:
+            if pending == None:
+                continue
+            if tail == None:
+                tail = (pending[0], pending[1], pending[2])
+            else:
+                tail = (min(tail[0], pending[0]), min(tail[1], pending[1]), max(tail[2], pending[2]))
+        return tail
+
+    # -------------------------------------------------------------------------
+
+    def __push(self, levelIndex, t, yMin, yMax):
+        """
+        Add an entry to a level and aggregate it into the next level.
+
+        Parameters
+        ----------
+        levelIndex : int
+            Index of the level to add the entry to.
+        t : float
+            Time [s] of the entry (i.e., of its first sample).
+        yMin : float
+            Minimum value of the entry.
+        yMax : float
+            Maximum value of the entry.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__levels[levelIndex].append((t, yMin, yMax))
+
+        # Aggregate into next coarser level
+        nextIndex = levelIndex + 1
+        if nextIndex < len(self.__levels):
+            pending = self.__pending[nextIndex]
+            if pending == None:
+                pending = [t, yMin, yMax, 1]
+                self.__pending[nextIndex] = pending
+            else:
+                pending[1] = min(pending[1], yMin)
+                pending[2] = max(pending[2], yMax)
+                pending[3] += 1
+
+            if pending[3] == self.__factor:
+                self.__pending[nextIndex] = None
+                self.__push(nextIndex, pending[0], pending[1], pending[2])
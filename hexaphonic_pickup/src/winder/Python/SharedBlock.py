@@ -0,0 +1,122 @@
+"""
+Named shared memory block to exchange data between processes.
+
+@author: Marc Hensel
+@contact: http://www.haw-hamburg.de/marc-hensel
+@copyright: 2024
+@version: 2024.10.19
+@license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
+"""
+import os
+import sys
+from multiprocessing import shared_memory, resource_tracker
+
+class SharedBlock():
+
+    # =========================================================================
+    # ========== Constructor ==================================================
+    # =========================================================================
+
+    def __init__(self, name, size, isCreate=False):
+        """
+        Constructor.
+
+        The process creating the block owns it and removes it on close().
+        Other processes attach to the block by its name and may detach at any
+        time without affecting the block.
+
+        Parameters
+        ----------
+        name : string
+            System-wide name of the block.
+        size : int
+            Size of the block [bytes].
+        isCreate : bool, optional
+            Create the block if True, else attach to an existing block. (Default: False)
+
+        Returns
+        -------
+        None.
+
+        """
+        self._isOwner = isCreate
+        if isCreate:
+            self.__memory = self.__create(name, size)
+        else:
+            self.__memory = self.__attach(name)
+        self._buffer = self.__memory.buf
+
+    # -------------------------------------------------------------------------
+
+    def __create(self, name, size):
+        """
+        Create the block, replacing a block left over by a terminated owner.
+
+        Parameters
+        ----------
+        name : string
+            System-wide name of the block.
+        size : int
+            Size of the block [bytes].
+
+        Returns
+        -------
+        multiprocessing.shared_memory.SharedMemory
+            Created block (initialized with zeros).
+
+        """
+        try:
+            return shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            print('WARNING: Replacing shared memory {}'.format(name))
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+    # -------------------------------------------------------------------------
+
+    def __attach(self, name):
+        """
+        Attach to an existing block.
+
+        On POSIX systems, Python's resource tracker removes shared memory
+        attached to by a process when the process ends (Python < 3.13). The
+        block is therefore unregistered, so that only its owner removes it.
+
+        Parameters
+        ----------
+        name : string
+            System-wide name of the block.
+
+        Returns
+        -------
+        multiprocessing.shared_memory.SharedMemory
+            Attached block.
+
+        """
+        if sys.version_info >= (3, 13):
+            return shared_memory.SharedMemory(name=name, track=False)
+
+        memory = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+    # -------------------------------------------------------------------------
+
+    def close(self):
+        """
+        Detach from the block and remove it, if this process has created it.
+
+        Returns
+        -------
+        None.
+
+        """
+        if self.__memory != None:
+            self._buffer = None
+            self.__memory.close()
+            if self._isOwner:
+                self.__memory.unlink()
+            self.__memory = None
@@ -0,0 +1,124 @@
+"""
+Latest winder state in shared memory, published by one process and read by many.
+
+@author: Marc Hensel
+@contact: http://www.haw-hamburg.de/marc-hensel
+@copyright: 2024
+@version: 2024.10.19
+@license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
+"""
+import time
+import struct
+from SharedBlock import SharedBlock
+
+class SharedState(SharedBlock):
+
+    # =========================================================================
+    # ========== Class constants ==============================================
+    # =========================================================================
+
+    # State fields and their struct format (little-endian, no padding)
+    _fields = [
+        ('time', 'd'),                  # Publishing time as time.time() [s]
+        ('heartbeat', 'Q'),             # Incremented with each update
+        ('isRunning', '?'),             # False after the publisher has shut down
+        ('turns', 'q'),                 # Revolution counter
+        ('speedRevsPerSec', 'd'),       # Target speed [rps]
+        ('actualRevsPerSec', 'd'),      # Speed estimated from counter [rps]
+        ('isEnabled', '?'),             # Motor enabled
+        ('isClockwise', '?'),           # Turning direction
+        ('isStalled', '?'),             # Motor has been stopped due to a stall
+        ('isFault', '?'),               # Motor has been stopped due to a missing or invalid reply
+        ('errorCount', 'I')             # Number of failed serial transactions
+    ]
+    _sequenceFormat = '<Q'
+    _payloadFormat = '<' + ''.join([code for _, code in _fields])
+
+    # =========================================================================
+    # ========== Constructor ==================================================
+    # =========================================================================
+
+    def __init__(self, name, isCreate=False):
+        """
+        Constructor.
+
+        The state is protected by a sequence counter (seqlock): The publisher
+        makes the counter odd before and even after writing. Readers copy the
+        state and retry if the counter was odd or has changed meanwhile. The
+        publisher never waits for readers, and readers never block each other.
+
+        Parameters
+        ----------
+        name : string
+            System-wide name of the shared memory.
+        isCreate : bool, optional
+            Create the shared memory as publisher if True, else attach as reader. (Default: False)
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__payloadOffset = struct.calcsize(self._sequenceFormat)
+        self.__payloadSize = struct.calcsize(self._payloadFormat)
+        super().__init__(name, self.__payloadOffset + self.__payloadSize, isCreate)
+        self.__sequence = 0
+
+    # =========================================================================
+    # ========== Read/write data ==============================================
+    # =========================================================================
+
+    def write(self, state):
+        """
+        Publish a new state (only to be called by the process having created the memory).
+
+        Parameters
+        ----------
+        state : dict
+            Values of all fields in _fields except 'time' and 'heartbeat', which are set automatically.
+
+        Returns
+        -------
+        None.
+
+        """
+        values = dict(state, time=time.time(), heartbeat=self.__sequence // 2 + 1)
+        payload = struct.pack(self._payloadFormat, *[values[name] for name, _ in self._fields])
+
+        # Odd sequence number while writing
+        self.__sequence += 1
+        struct.pack_into(self._sequenceFormat, self._buffer, 0, self.__sequence)
+        self._buffer[self.__payloadOffset:self.__payloadOffset + self.__payloadSize] = payload
+        self.__sequence += 1
+        struct.pack_into(self._sequenceFormat, self._buffer, 0, self.__sequence)
+
+    # -------------------------------------------------------------------------
+
+    def read(self, maxRetries=1000):
+        """
+        Read a consistent copy of the latest state.
+
+        Parameters
+        ----------
+        maxRetries : int, optional
+            Maximum number of attempts while the state is being written. (Default: 1000)
+
+        Returns
+        -------
+        dict
+            Values of all fields, or None if nothing has been published yet
+            or no consistent copy could be read.
+
+        """
+        for _ in range(maxRetries):
+            sequenceBefore = struct.unpack_from(self._sequenceFormat, self._buffer, 0)[0]
+            if sequenceBefore == 0:
+                return None
+            if sequenceBefore % 2 == 0:
+                payload = bytes(self._buffer[self.__payloadOffset:self.__payloadOffset + self.__payloadSize])
+                sequenceAfter = struct.unpack_from(self._sequenceFormat, self._buffer, 0)[0]
+                if sequenceAfter == sequenceBefore:
+                    values = struct.unpack(self._payloadFormat, payload)
+                    return {name: value for (name, _), value in zip(self._fields, values)}
+            time.sleep(0)
+        return None
@@ -0,0 +1,360 @@
+"""
+Online detection of stalls by comparing counted and expected motor speed.
+
+@author: Marc Hensel
+@contact: http://www.haw-hamburg.de/marc-hensel
+@copyright: 2024
+@version: 2024.10.19
+@license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
+"""
+import time
+import threading
+from collections import deque
+
+class StallDetector():
+
+    # =========================================================================
+    # ========== Class constants ==============================================
+    # =========================================================================
+
+    # Ramp model of the Arduino's StepperMotor class
+    _revsPerMove = 10 / 200         # Steps per call of moveSteps() / steps per revolution
+    _rampDivisor = 5                # Speed approaches target by 1/5 of the difference per move
+    _rampSnapRevsPerSec = 0.25      # Speed is set to target if difference is smaller
+    _minMovingRevsPerSec = 0.5      # Motor does not move at smaller speeds
+
+    # Window times are relative to an origin moved forward after this period [s]
+    _rebasePeriodSec = 600.0
+
+    # =========================================================================
+    # ========== Constructor ==================================================
+    # =========================================================================
+
+    def __init__(self, windowSec=0.6, minSpeedRatio=0.5, minRevsPerSec=2.0, holdSamples=2):
+        """
+        Constructor.
+
+        The detector receives samples of the revolution counter and estimates
+        the actual speed as slope of a least-squares line through the samples
+        of a sliding time window. The expected speed follows the commanded
+        target speed using the same acceleration ramp as the Arduino. Running
+        sums keep the cost per sample constant. A stall is reported if the
+        actual speed stays below a fraction of the expected speed for several
+        samples in a row, or if the counter decreases unexpectedly (e.g., the
+        Arduino has been reset).
+
+        Parameters
+        ----------
+        windowSec : float, optional
+            Length of the sliding window [s]. (Default: 0.6)
+        minSpeedRatio : float, optional
+            Actual speed below this fraction of the expected speed is an anomaly. (Default: 0.5)
+        minRevsPerSec : float, optional
+            Expected speed below this value is not checked [rps]. (Default: 2.0)
+        holdSamples : int, optional
+            Number of consecutive anomalous samples to report a stall. (Default: 2)
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__windowSec = windowSec
+        self.__minSpeedRatio = minSpeedRatio
+        self.__minRevsPerSec = minRevsPerSec
+        self.__holdSamples = holdSamples
+        self.__lock = threading.Lock()
+
+        # Ramp model
+        self.__isEnabled = False
+        self.__targetRevsPerSec = 0.0
+        self.__modelRevsPerSec = 0.0
+        self.__modelTime = time.monotonic()
+
+        # Sliding window and state
+        self.__timeOrigin = self.__modelTime
+        self.__clearWindow()
+        self.__actualRevsPerSec = 0.0
+        self.__expectedRevsPerSec = 0.0
+        self.__isStalled = False
+
+    # =========================================================================
+    # ========== Commanded state ==============================================
+    # =========================================================================
+
+    def setEnabled(self, isEnabled, t=None):
+        """
+        Notify the detector that the motor has been enabled or disabled.
+
+        Enabling the motor clears the sliding window and a reported stall.
+
+        Parameters
+        ----------
+        isEnabled : boolean
+            True if the motor has been enabled, else False.
+        t : float, optional
+            Time as time.monotonic() [s]. Current time, if None. (Default: None)
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.__lock:
+            self.__advanceModel(self.__now(t))
+            self.__isEnabled = isEnabled
+            if isEnabled:
+                self.__clearWindow()
+                self.__isStalled = False
+
+    # -------------------------------------------------------------------------
+
+    def setTargetSpeed(self, revsPerSec, t=None):
+        """
+        Notify the detector about a new target speed.
+
+        Parameters
+        ----------
+        revsPerSec : float
+            Target speed [rps].
+        t : float, optional
+            Time as time.monotonic() [s]. Current time, if None. (Default: None)
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.__lock:
+            self.__advanceModel(self.__now(t))
+            self.__targetRevsPerSec = float(revsPerSec)
+
+    # -------------------------------------------------------------------------
+
+    def resetCount(self):
+        """
+        Notify the detector that the revolution counter has been reset.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.__lock:
+            self.__clearWindow()
+
+    # =========================================================================
+    # ========== Samples ======================================================
+    # =========================================================================
+
+    def addSample(self, count, t=None):
+        """
+        Add a sample of the revolution counter and check for a stall.
+
+        Parameters
+        ----------
+        count : int
+            Revolution counter value.
+        t : float, optional
+            Sample time as time.monotonic() [s]. Current time, if None. (Default: None)
+
+        Returns
+        -------
+        bool
+            True if a stall is detected with this sample, else False (also
+            if the stall has already been reported before).
+
+        """
+        with self.__lock:
+            t = self.__now(t)
+            self.__advanceModel(t)
+            if (not self.__isEnabled) or self.__isStalled:
+                return False
+
+            # Counter must not decrease (else Arduino has been reset)
+            if (len(self.__window) > 0) and (count < self.__window[-1][1]):
+                self.__isStalled = True
+                return True
+
+            # Add sample and remove samples outside window (keep at least 3)
+            if t - self.__timeOrigin > self._rebasePeriodSec:
+                self.__rebaseWindow(t)
+            x = t - self.__timeOrigin
+            self.__addToWindow(x, count, self.__modelRevsPerSec)
+            while (len(self.__window) > 3) and (x - self.__window[0][0] > self.__windowSec):
+                self.__removeFromWindow()
+
+            # Compare actual and expected speed
+            if not self.__updateSpeeds():
+                return False
+            if self.__actualRevsPerSec < self.__minSpeedRatio * self.__expectedRevsPerSec:
+                self.__anomalyCount += 1
+            else:
+                self.__anomalyCount = 0
+            self.__isStalled = (self.__anomalyCount >= self.__holdSamples)
+            return self.__isStalled
+
+    # -------------------------------------------------------------------------
+
+    def getSpeeds(self):
+        """
+        Get the latest speed estimates.
+
+        Returns
+        -------
+        tuple
+            Actual and expected speed (actualRevsPerSec, expectedRevsPerSec) [rps].
+
+        """
+        with self.__lock:
+            return (self.__actualRevsPerSec, self.__expectedRevsPerSec)
+
+    # -------------------------------------------------------------------------
+
+    def isStalled(self):
+        """
+        Check whether a stall has been detected since the motor was enabled.
+
+        Returns
+        -------
+        bool
+            True if a stall has been detected, else False.
+
+        """
+        with self.__lock:
+            return self.__isStalled
+
+    # =========================================================================
+    # ========== Sliding window ===============================================
+    # =========================================================================
+
+    def __clearWindow(self):
+        """ Remove all samples from the sliding window. """
+        self.__window = deque()
+        self.__sumX = 0.0
+        self.__sumY = 0.0
+        self.__sumXX = 0.0
+        self.__sumXY = 0.0
+        self.__sumExpected = 0.0
+        self.__anomalyCount = 0
+
+    # -------------------------------------------------------------------------
+
+    def __addToWindow(self, x, y, expected):
+        """ Append a sample (time x, count y, expected speed) to the sliding window. """
+        self.__window.append((x, y, expected))
+        self.__sumX += x
+        self.__sumY += y
+        self.__sumXX += x * x
+        self.__sumXY += x * y
+        self.__sumExpected += expected
+
+    # -------------------------------------------------------------------------
+
+    def __removeFromWindow(self):
+        """ Remove the oldest sample from the sliding window. """
+        x, y, expected = self.__window.popleft()
+        self.__sumX -= x
+        self.__sumY -= y
+        self.__sumXX -= x * x
+        self.__sumXY -= x * y
+        self.__sumExpected -= expected
+
+    # -------------------------------------------------------------------------
+
+    def __rebaseWindow(self, t):
+        """
+        Move the time origin to t and recompute the running sums.
+
+        Keeps the running sums small, so that the least-squares slope does not
+        lose precision in long sessions.
+
+        Parameters
+        ----------
+        t : float
+            New time origin as time.monotonic() [s].
+
+        Returns
+        -------
+        None.
+
+        """
+        offset = t - self.__timeOrigin
+        samples = [(x - offset, y, expected) for x, y, expected in self.__window]
+        anomalyCount = self.__anomalyCount
+        self.__clearWindow()
+        for x, y, expected in samples:
+            self.__addToWindow(x, y, expected)
+        self.__anomalyCount = anomalyCount
+        self.__timeOrigin = t
+
+    # -------------------------------------------------------------------------
+
+    def __updateSpeeds(self):
+        """
+        Update actual and expected speed from the sliding window.
+
+        Returns
+        -------
+        bool
+            True if the speeds shall be compared, else False (e.g., window
+            not filled or expected speed too small).
+
+        """
+        n = len(self.__window)
+        if n < 3:
+            return False
+
+        # Slope of least-squares line through (time, count)
+        denominator = n * self.__sumXX - self.__sumX * self.__sumX
+        if denominator <= 0.0:
+            return False
+        self.__actualRevsPerSec = (n * self.__sumXY - self.__sumX * self.__sumY) / denominator
+        self.__expectedRevsPerSec = self.__sumExpected / n
+
+        # Check only filled windows at sufficient speed
+        isWindowFilled = (self.__window[-1][0] - self.__window[0][0] >= 0.5 * self.__windowSec)
+        return isWindowFilled and (self.__expectedRevsPerSec >= self.__minRevsPerSec)
+
+    # =========================================================================
+    # ========== Ramp model ===================================================
+    # =========================================================================
+
+    def __now(self, t):
+        """ Return t or, if t is None, the current time as time.monotonic() [s]. """
+        return time.monotonic() if t == None else t
+
+    # -------------------------------------------------------------------------
+
+    def __advanceModel(self, t):
+        """
+        Advance the expected motor speed to time t.
+
+        Mirrors StepperMotor::moveSteps() and StepperMotor::adaptSpeed() of
+        the Arduino. The speed is adapted before each move of 10 steps. Moves
+        take no time if the motor is too slow to turn. The loop ends after
+        few iterations, when the speed has reached the target.
+
+        Parameters
+        ----------
+        t : float
+            Time as time.monotonic() [s].
+
+        Returns
+        -------
+        None.
+
+        """
+        if self.__isEnabled:
+            while (self.__modelTime < t) and (self.__modelRevsPerSec != self.__targetRevsPerSec):
+                # Adapt speed (accelerate toward target speed)
+                delta = self.__targetRevsPerSec - self.__modelRevsPerSec
+                if abs(delta) < self._rampSnapRevsPerSec:
+                    self.__modelRevsPerSec = self.__targetRevsPerSec
+                else:
+                    self.__modelRevsPerSec += delta / self._rampDivisor
+
+                # Duration of the move
+                if self.__modelRevsPerSec > self._minMovingRevsPerSec:
+                    self.__modelTime += self._revsPerMove / self.__modelRevsPerSec
+        self.__modelTime = max(self.__modelTime, t)
@@ -0,0 +1,308 @@
+"""
+Live plot of the winder's speed and turns for the GUI.
+
+@author: Marc Hensel
+@contact: http://www.haw-hamburg.de/marc-hensel
+@copyright: 2024
+@version: 2024.10.19
+@license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
+"""
+import time
+import threading
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from DecimatedHistory import DecimatedHistory
+
+class TelemetryPlot():
+
+    # =========================================================================
+    # ========== Class constants ==============================================
+    # =========================================================================
+
+    # Names of the recorded signals
+    _signals = ['commandedRps', 'actualRps', 'turns']
+
+    # =========================================================================
+    # ========== Constructor ==================================================
+    # =========================================================================
+
+    def __init__(self, parent, maxFps=10.0, maxPoints=512, width=5.0, height=4.0):
+        """
+        Constructor.
+
+        The plot shows the commanded and actual speed as well as the turns
+        over time, either for the current coil (i.e., since the last counter
+        reset) or for the whole session. Samples can be added from any thread.
+        Redrawing happens in the Tk main loop at a limited frame rate and only
+        if new samples are available. Only the data lines are redrawn onto a
+        cached background (blitting), unless the axes' limits change.
+
+        Parameters
+        ----------
+        parent : tkinter.Frame
+            GUI object to place the plot in.
+        maxFps : float, optional
+            Maximum number of redraws per second. (Default: 10.0)
+        maxPoints : int, optional
+            Maximum number of min/max pairs plotted per signal. (Default: 512)
+        width : float, optional
+            Figure width [inch]. (Default: 5.0)
+        height : float, optional
+            Figure height [inch]. (Default: 4.0)
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__parent = parent
+        self.__framePeriodMs = max(1, int(1000.0 / maxFps))
+        self.__maxPoints = maxPoints
+
+        # Recorded data (shared with threads adding samples)
+        self.__lock = threading.Lock()
+        self.__histories = {name: DecimatedHistory() for name in self._signals}
+        self.__sessionStartTime = time.monotonic()
+        self.__coilStartTime = self.__sessionStartTime
+        self.__isShowCoil = True
+        self.__isDirty = True
+
+        # Figure with speed (top) and turns (bottom)
+        self.__figure = Figure(figsize=(width, height), dpi=100)
+        self.__speedAxes = self.__figure.add_subplot(2, 1, 1)
+        self.__turnsAxes = self.__figure.add_subplot(2, 1, 2, sharex=self.__speedAxes)
+        self.__speedAxes.set_ylabel('Speed [rps]')
+        self.__turnsAxes.set_ylabel('Turns')
+        self.__turnsAxes.set_xlabel('Time [min]')
+        self.__speedAxes.set_xlim(0.0, 1.0)
+        self.__speedAxes.set_ylim(0.0, 9.0)
+        self.__turnsAxes.set_ylim(0.0, 100.0)
+        self.__speedAxes.grid(True)
+        self.__turnsAxes.grid(True)
+        self.__figure.tight_layout()
+
+        # Lines are 'animated', i.e., not part of the cached background
+        self.__lines = {
+            'commandedRps': self.__speedAxes.plot([], [], color='tab:red', label='Commanded', animated=True)[0],
+            'actualRps':    self.__speedAxes.plot([], [], color='tab:blue', label='Actual', animated=True)[0],
+            'turns':        self.__turnsAxes.plot([], [], color='tab:blue', animated=True)[0]
+        }
+        self.__speedAxes.legend(loc='upper left', fontsize='small')
+
+        # Canvas recaptures the background on every full draw (e.g., resize)
+        self.__background = None
+        self.__canvas = FigureCanvasTkAgg(self.__figure, master=parent)
+        self.__canvas.mpl_connect('draw_event', self.__onDraw)
+        self.__canvas.get_tk_widget().pack(side='top', fill='both', expand=True)
+
+        # Start frame loop
+        self.__parent.after(self.__framePeriodMs, self.__onFrame)
+
+    # =========================================================================
+    # ========== Data =========================================================
+    # =========================================================================
+
+    def addSample(self, commandedRps, actualRps, turns, t=None):
+        """
+        Record a sample of all signals. May be called from any thread.
+
+        Parameters
+        ----------
+        commandedRps : float
+            Speed set by the user (0 if the motor is disabled) [rps].
+        actualRps : float
+            Speed derived from the revolution counter [rps].
+        turns : int
+            Revolution counter value.
+        t : float, optional
+            Sample time as time.monotonic() [s]. Current time, if None. (Default: None)
+
+        Returns
+        -------
+        None.
+
+        """
+        if t == None:
+            t = time.monotonic()
+        with self.__lock:
+            self.__histories['commandedRps'].append(t, commandedRps)
+            self.__histories['actualRps'].append(t, actualRps)
+            self.__histories['turns'].append(t, turns)
+            self.__isDirty = True
+
+    # -------------------------------------------------------------------------
+
+    def markCoilStart(self, t=None):
+        """
+        Mark the start of a new coil (e.g., when the counter is reset).
+
+        Parameters
+        ----------
+        t : float, optional
+            Start time as time.monotonic() [s]. Current time, if None. (Default: None)
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.__lock:
+            self.__coilStartTime = time.monotonic() if t == None else t
+            self.__isDirty = True
+
+    # -------------------------------------------------------------------------
+
+    def setShowCoil(self, isShowCoil):
+        """
+        Select whether to show the current coil or the whole session.
+
+        Parameters
+        ----------
+        isShowCoil : boolean
+            Show data since start of current coil if True, else since start of session.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.__lock:
+            self.__isShowCoil = isShowCoil
+            self.__isDirty = True
+
+    # =========================================================================
+    # ========== Drawing ======================================================
+    # =========================================================================
+
+    def __onFrame(self):
+        """ Tk timer callback method redrawing the plot, if new data is available.
+
+        Returns
+        -------
+        None.
+
+        """
+        try:
+            with self.__lock:
+                isDirty = self.__isDirty
+                self.__isDirty = False
+                if isDirty:
+                    tStart = self.__coilStartTime if self.__isShowCoil else self.__sessionStartTime
+                    spans = {name: self.__histories[name].getSpan(tStart, self.__maxPoints) for name in self._signals}
+            if isDirty:
+                self.__redraw(tStart, spans)
+        finally:
+            self.__parent.after(self.__framePeriodMs, self.__onFrame)
+
+    # -------------------------------------------------------------------------
+
+    def __redraw(self, tStart, spans):
+        """
+        Update the lines' data and draw them.
+
+        Parameters
+        ----------
+        tStart : float
+            Time [s] corresponding to the origin of the time axis.
+        spans : dict
+            Pairs (times, values) per signal as returned by DecimatedHistory.getSpan().
+
+        Returns
+        -------
+        None.
+
+        """
+        # Update data (time relative to start in minutes)
+        tMax, speedMax, turnsMax = 0.0, 0.0, 0.0
+        for name, (times, values) in spans.items():
+            minutes = [(t - tStart) / 60.0 for t in times]
+            self.__lines[name].set_data(minutes, values)
+            if len(minutes) > 0:
+                tMax = max(tMax, minutes[-1])
+                if name == 'turns':
+                    turnsMax = max(turnsMax, max(values))
+                else:
+                    speedMax = max(speedMax, max(values))
+
+        # Grow axes' limits in steps, so that full redraws are rare
+        isLimitsChanged = False
+        isLimitsChanged |= self.__fitLimit(self.__speedAxes.get_xlim, self.__speedAxes.set_xlim, tMax, 1.0)
+        isLimitsChanged |= self.__fitLimit(self.__speedAxes.get_ylim, self.__speedAxes.set_ylim, speedMax, 9.0)
+        isLimitsChanged |= self.__fitLimit(self.__turnsAxes.get_ylim, self.__turnsAxes.set_ylim, turnsMax, 100.0)
+
+        # Full redraw (triggers __onDraw) or blit lines onto cached background
+        if isLimitsChanged or (self.__background == None):
+            self.__canvas.draw()
+        else:
+            self.__canvas.restore_region(self.__background)
+            self.__drawLines()
+            self.__canvas.blit(self.__figure.bbox)
+
+    # -------------------------------------------------------------------------
+
+    def __fitLimit(self, getLimits, setLimits, value, minUpper):
+        """
+        Adapt an axis' upper limit to the data's maximum value.
+
+        The limit grows by a factor of 2 when exceeded and shrinks back when
+        the data uses less than a quarter (e.g., after starting a new coil).
+
+        Parameters
+        ----------
+        getLimits : function
+            Axis' getter method (e.g., Axes.get_xlim).
+        setLimits : function
+            Axis' setter method (e.g., Axes.set_xlim).
+        value : float
+            Maximum value of the data to show.
+        minUpper : float
+            Smallest upper limit to use.
+
+        Returns
+        -------
+        bool
+            True if the limit has changed, else False.
+
+        """
+        lower, upper = getLimits()
+        newUpper = upper
+        while value > newUpper:
+            newUpper *= 2.0
+        while (value < newUpper / 4.0) and (newUpper / 2.0 >= minUpper):
+            newUpper /= 2.0
+        if newUpper != upper:
+            setLimits(lower, newUpper)
+            return True
+        return False
+
+    # -------------------------------------------------------------------------
+
+    def __drawLines(self):
+        """ Draw the animated lines onto the canvas.
+
+        Returns
+        -------
+        None.
+
+        """
+        for line in self.__lines.values():
+            line.axes.draw_artist(line)
+
+    # -------------------------------------------------------------------------
+
+    def __onDraw(self, event):
+        """ Canvas callback method caching the background after a full draw.
+
+        Parameters
+        ----------
+        event : matplotlib.backend_bases.DrawEvent
+            Draw event (not used).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__background = self.__canvas.copy_from_bbox(self.__figure.bbox)
+        self.__drawLines()
+        self.__canvas.blit(self.__figure.bbox)
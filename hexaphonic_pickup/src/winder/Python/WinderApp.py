@@ -4,13 +4,15 @@ Control app for a hexaphonic pickup winder.
 @author: Marc Hensel
 @contact: http://www.haw-hamburg.de/marc-hensel
 @copyright: 2024
-@version: 2024.07.07
+@version: 2024.10.19
 @license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
 """
+import os
+import csv
 import time
 import threading
 from ArduinoCOM import ArduinoCOM
-from WinderGUI import WinderGUI
+from StallDetector import StallDetector
 
 class WinderApp():
 
@@ -30,40 +32,85 @@ class WinderApp():
         'sendOk':               '>'
     }
 
+    # Maximum time to wait for replies to supervision queries [s]
+    _supervisionTimeoutSec = 0.25
+
     # =========================================================================
     # ========== Constructor ==================================================
     # =========================================================================
 
-    def __init__(self, serialCOM=None):
+    def __init__(self, serialCOM=None, supervisionPeriodSec=0.2, stallWindowSec=None, coilLogFile='coils.csv', isShowGUI=True):
         """
         Constructor.
         
         The contructor tries to connect to an Arduino using serial COM ports.
-        If connection succeeds, it generates and runs the GUI.
+        If connection succeeds, it generates and runs the GUI (unless the app
+        is used without GUI, e.g., by WinderDaemon).
+        
+        While the motor is enabled, a thread queries the revolution counter
+        periodically and disables the motor if a stall is detected or the
+        Arduino does not reply in time. Each query pauses the stepper for
+        about 3 ms only (receiving the command at the Arduino side), so that
+        the period is chosen for short detection delay (about 1 to 4 periods,
+        i.e., below 1 s by default).
         
         Parameters
         ----------
         serialCOM : int, optional
             Serial port Arduino is connected to (e.g., '3' for 'COM3').
             Tries to connect to ports 0 to 15, if argument is None. (Default: None)
+        supervisionPeriodSec : float, optional
+            Period to query the counter for stall detection [s]. Disables
+            stall detection, if None. (Default: 0.2)
+        stallWindowSec : float, optional
+            Time span of counter values the stall detection estimates the
+            speed from [s]. Should cover about 3 counter queries (e.g., when
+            the counter is queried by WinderDaemon). Uses 3 supervision
+            periods, if None. (Default: None)
+        coilLogFile : string, optional
+            CSV file to append the winding parameters of each coil to (e.g.,
+            for CoilQA). Disables the log, if None. (Default: 'coils.csv')
+        isShowGUI : bool, optional
+            Create and run the GUI. (Default: True)
 
         Returns
         -------
         None.
 
         """
+        # Stall detection (fed by revolution counter queries)
+        if stallWindowSec == None:
+            stallWindowSec = 3 * supervisionPeriodSec if supervisionPeriodSec != None else 0.6
+        self.__stallDetector = StallDetector(windowSec=stallWindowSec)
+        self.__supervisionPeriodSec = supervisionPeriodSec
+        self.__supervisionThread = None
+        self.__isMotorEnabled = False
+        self.__isFault = False
+        self.__stallCallback = None
+        self.__speedRevsPerSec = 0
+        self.__telemetry = None
+
+        # Winding parameters of the current coil
+        self.__coilLogFile = coilLogFile
+        self.__pickup = 1
+        self.__string = 1
+        self.__isClockwise = True
+        self.__startCoilLog()
+
         # Connect to Arduino (will reset Arduino => Runs setup())
         self.__threadLock = threading.Lock()
         self.__arduino = ArduinoCOM(serialCOM=serialCOM, baudRate=38_400)
 
-        # Create and start GUI
-        self.__gui = WinderGUI(parentApp=self)
+        # Create and start GUI (imported here, so that WinderDaemon does not load Tk and matplotlib)
+        if isShowGUI:
+            from WinderGUI import WinderGUI
+            self.__gui = WinderGUI(parentApp=self)
 
     # =========================================================================
     # ========== Serial connection ============================================
     # =========================================================================
 
-    def close(self, waitTimeSec=2.0):
+    def close(self, waitTimeSec=2.0, timeoutSec=None):
         """
         Requests Arduino to stop and disable stepper motor and closes serial connection.
 
@@ -71,6 +118,9 @@ class WinderApp():
         ----------
         waitTimeSec : float
             Delay before stopping and disabling stepper [s] (Default: 2.0)
+        timeoutSec : float, optional
+            Maximum time to wait for each of the Arduino's replies [s]. Uses
+            the connection's read timeout, if None. (Default: None)
 
         Returns
         -------
@@ -79,21 +129,53 @@ class WinderApp():
         """
         time.sleep(waitTimeSec)
         print('\nClosing connection:')
-        self.setSpeed(revsPerSec=0)
-        self.enableMotor(False)
-        time.sleep(1.0)             # Wait for Arduino to read buffer
-        self.__arduino.close()
+        try:
+            self.setSpeed(revsPerSec=0, timeoutSec=timeoutSec)
+            self.enableMotor(False, timeoutSec=timeoutSec)
+            time.sleep(1.0)             # Wait for Arduino to read buffer
+            self.__logCoil(self.getRevCount(timeoutSec=timeoutSec))
+        except (TimeoutError, ValueError) as error:
+            print('WARNING: Arduino did not stop properly ({})'.format(error))
+        finally:
+            self.__arduino.close()
+
+    # -------------------------------------------------------------------------
+
+    def resetInput(self):
+        """
+        Discard data received from the Arduino, but not read yet.
+
+        Resynchronizes commands and replies after a fault (e.g., a reply
+        received after its timeout), so that the motor can be enabled again
+        without reconnecting (i.e., resetting) the Arduino.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.__threadLock:
+            self.__arduino.resetInput()
 
     # -------------------------------------------------------------------------
 
-    def __sendWithReply(self, command, isRequestAck=True):
+    def __sendWithReply(self, command, isRequestAck=True, timeoutSec=None):
         """
         Send command to Arduino requesting and waiting for reply.
 
+        Data received before sending the command (e.g., a reply to an earlier
+        command received after its timeout) is discarded, so that the reply
+        belongs to this command.
+
         Parameters
         ----------
         command : string
             Command string to send (typically chars from dictionary _command).
+        isRequestAck : bool, optional
+            Request 'ok' as reply. (Default: True)
+        timeoutSec : float, optional
+            Maximum time to wait for the reply [s]. Uses the connection's
+            read timeout, if None. (Default: None)
 
         Returns
         -------
@@ -102,19 +184,46 @@ class WinderApp():
 
         """
         # Send command (and request for acknowledgement)
+        self.__arduino.resetInput()
         if isRequestAck == True:
             self.__arduino.writeString(command + self._commands['sendOk'])
         else:
             self.__arduino.writeString(command)
             
         # Receive and return reply
-        return self.__arduino.readLine()
+        return self.__arduino.readLine(timeoutSec=timeoutSec)
+
+    # -------------------------------------------------------------------------
+
+    def __printReply(self, reply):
+        """
+        Print the reply to a command.
+
+        Parameters
+        ----------
+        reply : string
+            Reply send by the Arduino, or None if there was no reply.
+
+        Raises
+        ------
+        TimeoutError
+            If there was no reply.
+
+        Returns
+        -------
+        None.
+
+        """
+        if reply == None:
+            print('... no reply')
+            raise TimeoutError('No reply from Arduino')
+        print('... ' + reply)
 
     # =========================================================================
     # ========== Motor control ================================================
     # =========================================================================
 
-    def enableMotor(self, isEnabled):
+    def enableMotor(self, isEnabled, timeoutSec=None):
         """
         Enable or disable stepper motor.
         
@@ -126,30 +235,46 @@ class WinderApp():
         ----------
         isEnabled : boolean
             Enable stepper if True, else disable stepper.
+        timeoutSec : float, optional
+            Maximum time to wait for the Arduino's reply [s]. Uses the
+            connection's read timeout, if None. (Default: None)
+
+        Raises
+        ------
+        TimeoutError
+            If the Arduino does not reply (the motor is considered disabled
+            anyway when disabling it).
 
         Returns
         -------
         None.
 
         """
-        self.__threadLock.acquire()
-
-        # Determine command
+        with self.__threadLock:
+            # Determine command
+            if isEnabled:
+                print('Enable motor', end=' ')
+                command = self._commands['enableMotor']
+            else:
+                print('Disable motor', end=' ')
+                command = self._commands['disableMotor']
+
+            # Send command and print reply
+            reply = self.__sendWithReply(command, timeoutSec=timeoutSec)
+            if (reply != None) or (not isEnabled):
+                self.__isMotorEnabled = isEnabled
+                self.__stallDetector.setEnabled(isEnabled)
+            self.__printReply(reply)
+            if isEnabled:
+                self.__isFault = False
+
+        # Supervise motor while enabled
         if isEnabled:
-            print('Enable motor', end=' ')
-            command = self._commands['enableMotor']
-        else:
-            print('Disable motor', end=' ')
-            command = self._commands['disableMotor']
-
-        # Send command and print reply
-        reply = self.__sendWithReply(command)
-        print('... ' + reply)            
-        self.__threadLock.release()
+            self.__startSupervision()
 
     # -------------------------------------------------------------------------
 
-    def setDirection(self, isClockwise):
+    def setDirection(self, isClockwise, timeoutSec=None):
         """
         Set the turning direction of the stepper motor.
 
@@ -157,102 +282,418 @@ class WinderApp():
         ----------
         isClockwise : boolean
             Turn steppr clockwise if True, else counter-clockwise.
+        timeoutSec : float, optional
+            Maximum time to wait for the Arduino's reply [s]. Uses the
+            connection's read timeout, if None. (Default: None)
+
+        Raises
+        ------
+        TimeoutError
+            If the Arduino does not reply.
 
         Returns
         -------
         None.
 
         """
-        self.__threadLock.acquire()
-
-        # Determine command
-        if isClockwise:
-            print('Turn clockwise', end=' ')
-            command = self._commands['dirClockwise']
-        else:
-            print('Turn counter-clockwise', end=' ')
-            command = self._commands['dirCounterClockwise']
-
-        # Send command and print reply
-        reply = self.__sendWithReply(command)
-        print('... ' + reply)            
-        self.__threadLock.release()
+        with self.__threadLock:
+            # Determine command
+            if isClockwise:
+                print('Turn clockwise', end=' ')
+                command = self._commands['dirClockwise']
+            else:
+                print('Turn counter-clockwise', end=' ')
+                command = self._commands['dirCounterClockwise']
+
+            # Send command and print reply
+            reply = self.__sendWithReply(command, timeoutSec=timeoutSec)
+            self.__printReply(reply)
+            self.__isClockwise = isClockwise
 
     # -------------------------------------------------------------------------
     
-    def setSpeed(self, revsPerSec):
+    def setSpeed(self, revsPerSec, timeoutSec=None):
         """ Set stepper motor speed.
         
         Parameters
         ----------
         revsPerSec : int
             Motor speed [revolutions/sec].
+        timeoutSec : float, optional
+            Maximum time to wait for the Arduino's reply [s]. Uses the
+            connection's read timeout, if None. (Default: None)
+
+        Raises
+        ------
+        TimeoutError
+            If the Arduino does not reply.
 
         Returns
         -------
         None.
 
         """
-        self.__threadLock.acquire()
-
-        # Command + value
-        print('Set speed [rps]: {}'.format(revsPerSec), end=' ')
-        command = self._commands['setSpeedRevsPerSec']
-        command += chr(revsPerSec)
-
-        # Send command and print reply
-        reply = self.__sendWithReply(command)
-        print('... ' + reply)
-        self.__threadLock.release()
+        with self.__threadLock:
+            # Command + value
+            print('Set speed [rps]: {}'.format(revsPerSec), end=' ')
+            command = self._commands['setSpeedRevsPerSec']
+            command += chr(revsPerSec)
+
+            # Send command and print reply
+            reply = self.__sendWithReply(command, timeoutSec=timeoutSec)
+            self.__printReply(reply)
+            self.__stallDetector.setTargetSpeed(revsPerSec)
+            self.__speedRevsPerSec = revsPerSec
+            self.__coilMaxSpeed = max(self.__coilMaxSpeed, revsPerSec)
 
     # =========================================================================
     # ========== Revolution counter ===========================================
     # =========================================================================
 
-    def getRevCount(self):
+    def getRevCount(self, timeoutSec=None):
         """ Get count of motor full revolutions from Arduino.
         
         Warning: Querying the rev count leads to a small pause in turning the
         stepper motor at the Arduino side. To run the stepper smoothly, do not
         use the query.
 
+        Parameters
+        ----------
+        timeoutSec : float, optional
+            Maximum time to wait for the Arduino's reply [s]. Uses the
+            connection's read timeout, if None. (Default: None)
+
+        Raises
+        ------
+        TimeoutError
+            If the Arduino does not reply.
+        ValueError
+            If the reply is not a number.
+
         Returns
         -------
         int
             Full revolutions since start or last counter reset.
 
         """
-        self.__threadLock.acquire()
+        with self.__threadLock:
+            # Determine and send command
+            command = self._commands['getRevCount']
+            reply = self.__sendWithReply(command, isRequestAck=False, timeoutSec=timeoutSec)
+            if reply == None:
+                raise TimeoutError('No reply from Arduino')
+            count = int(reply)
+
+            # Check for stall (within lock, so that no counter reset interferes)
+            isStalled = self.__stallDetector.addSample(count)
+            self.__updateTelemetry(count)
+
+        # Handle stall outside lock, as it disables the motor
+        if isStalled:
+            self.__onStall(count)
+        return count
 
-        # Determine and send command
-        command = self._commands['getRevCount']
-        reply = self.__sendWithReply(command, isRequestAck=False)
-        
-        # Return counter as value
-        self.__threadLock.release()
-        return int(reply)
+    # -------------------------------------------------------------------------
+
+    def getTelemetry(self):
+        """
+        Get the state at the latest counter query (does not query the Arduino).
+
+        Returns
+        -------
+        dict
+            'sampleId' (incremented with each query), 'turns', 'speedRevsPerSec'
+            (target speed [rps]), 'actualRevsPerSec' (speed estimated by stall
+            detection [rps]), 'isEnabled', 'isFault' (motor stopped after a
+            failed query), and 'isConnected' (always True, as the app owns the
+            serial connection), or None before the first query.
+
+        """
+        if self.__telemetry == None:
+            return None
+        return dict(self.__telemetry, isFault=self.__isFault)
+
+    # -------------------------------------------------------------------------
+
+    def __updateTelemetry(self, count):
+        """
+        Store the state at a counter query.
+
+        Parameters
+        ----------
+        count : int
+            Counter value.
+
+        Returns
+        -------
+        None.
+
+        """
+        actualRevsPerSec, _ = self.__stallDetector.getSpeeds()
+        sampleId = self.__telemetry['sampleId'] + 1 if self.__telemetry != None else 0
+        self.__telemetry = {
+            'sampleId': sampleId,
+            'turns': count,
+            'speedRevsPerSec': self.__speedRevsPerSec,
+            'actualRevsPerSec': actualRevsPerSec if self.__isMotorEnabled else 0.0,
+            'isEnabled': self.__isMotorEnabled,
+            'isConnected': True
+        }
 
     # -------------------------------------------------------------------------
 
-    def resetRevCounter(self):
+    def resetRevCounter(self, timeoutSec=None):
         """
         Reset the Arduino's step counter.
         
+        If the coil log is enabled and the counter is not 0, the winding
+        parameters of the finished coil are appended to the log.
+
+        Parameters
+        ----------
+        timeoutSec : float, optional
+            Maximum time to wait for the Arduino's reply [s]. Uses the
+            connection's read timeout, if None. (Default: None)
+
+        Raises
+        ------
+        TimeoutError
+            If the Arduino does not reply.
+        ValueError
+            If the reply to the counter query is not a number.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__logCoil(self.getRevCount(timeoutSec=timeoutSec))
+        with self.__threadLock:
+            # Determine command
+            command = self._commands['resetRevCounter']
+            print('Reset counter', end=' ')
+
+            # Send command and print reply
+            reply = self.__sendWithReply(command, timeoutSec=timeoutSec)
+            self.__printReply(reply)
+            self.__stallDetector.resetCount()
+            self.__startCoilLog()
+
+    # =========================================================================
+    # ========== Coil log =====================================================
+    # =========================================================================
+
+    def setCoilInfo(self, pickup, string):
+        """
+        Set the pickup and string the current coil is wound for.
+
+        Both are logged with the coil's winding parameters, so that CoilQA
+        can relate test results to the coils.
+
+        Parameters
+        ----------
+        pickup : int
+            Number of the pickup.
+        string : int
+            Number of the string (1 = high E to 6 = low E).
+
+        Returns
+        -------
+        None.
+
+        """
+        print('Coil for pickup {}, string {}'.format(pickup, string))
+        self.__pickup = pickup
+        self.__string = string
+
+    # -------------------------------------------------------------------------
+
+    def __startCoilLog(self):
+        """
+        Reset the winding parameters recorded for the current coil.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__coilStartTime = time.time()
+        self.__coilMaxSpeed = 0
+        self.__coilStalls = 0
+
+    # -------------------------------------------------------------------------
+
+    def __logCoil(self, turns):
+        """
+        Append the winding parameters of the current coil to the coil log.
+
+        Parameters
+        ----------
+        turns : int
+            Turns of the coil (nothing is logged, if 0).
+
+        Returns
+        -------
+        None.
+
+        """
+        if (self.__coilLogFile == None) or (turns <= 0):
+            return
+
+        # Append row (and header, if file is new)
+        isNewFile = not os.path.isfile(self.__coilLogFile)
+        with open(self.__coilLogFile, 'a', newline='') as file:
+            writer = csv.writer(file)
+            if isNewFile:
+                writer.writerow(['pickup', 'string', 'date', 'turns', 'maxSpeedRevsPerSec', 'isClockwise', 'durationSec', 'stalls'])
+            writer.writerow([
+                self.__pickup,
+                self.__string,
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.__coilStartTime)),
+                turns,
+                self.__coilMaxSpeed,
+                self.__isClockwise,
+                round(time.time() - self.__coilStartTime, 1),
+                self.__coilStalls])
+        print('Logged coil (pickup {}, string {}) with {} turns to {}'.format(self.__pickup, self.__string, turns, self.__coilLogFile))
+
+    # =========================================================================
+    # ========== Stall detection ==============================================
+    # =========================================================================
+
+    def setStallCallback(self, callback):
+        """
+        Set a function to call after the motor has been stopped due to a stall.
+
+        Parameters
+        ----------
+        callback : function
+            Function taking the counter value at the stall as argument, or None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__stallCallback = callback
+
+    # -------------------------------------------------------------------------
+
+    def getSpeeds(self):
+        """
+        Get the speeds estimated by the stall detection from the latest counter queries.
+
+        Returns
+        -------
+        tuple
+            Actual and expected speed (actualRevsPerSec, expectedRevsPerSec) [rps].
+
+        """
+        return self.__stallDetector.getSpeeds()
+
+    # -------------------------------------------------------------------------
+
+    def __startSupervision(self):
+        """
+        Start a thread querying the counter periodically while the motor is enabled.
+
         Returns
         -------
         None.
 
         """
-        self.__threadLock.acquire()
+        if self.__supervisionPeriodSec == None:
+            return
+        if (self.__supervisionThread == None) or (not self.__supervisionThread.is_alive()):
+            self.__supervisionThread = threading.Thread(target=self.__supervise, daemon=True)
+            self.__supervisionThread.start()
 
-        # Determine command
-        command = self._commands['resetRevCounter']
-        print('Reset counter', end=' ')
+    # -------------------------------------------------------------------------
+
+    def __supervise(self):
+        """
+        Thread method querying the counter (i.e., feeding the stall detector).
+
+        Ends when the motor is disabled.
+
+        Returns
+        -------
+        None.
+
+        """
+        while self.__isMotorEnabled:
+            time.sleep(self.__supervisionPeriodSec)
+            if self.__isMotorEnabled:
+                try:
+                    self.getRevCount(timeoutSec=self._supervisionTimeoutSec)
+                except (TimeoutError, ValueError) as error:
+                    self.__onFault(error)
+
+    # -------------------------------------------------------------------------
+
+    def __onStall(self, count):
+        """
+        Disable the motor and notify the callback after a detected stall.
+
+        Parameters
+        ----------
+        count : int
+            Counter value at the stall.
+
+        Returns
+        -------
+        None.
+
+        """
+        actualRevsPerSec, expectedRevsPerSec = self.__stallDetector.getSpeeds()
+        print('WARNING: Stall detected at {} turns ({:.1f} rps instead of {:.1f} rps)'.format(count, actualRevsPerSec, expectedRevsPerSec))
+        self.__stopAfterAnomaly(count)
+
+    # -------------------------------------------------------------------------
+
+    def __onFault(self, error):
+        """
+        Disable the motor and notify the callback after a failed supervision query.
+
+        Parameters
+        ----------
+        error : Exception
+            Error raised by the query (e.g., TimeoutError if there is no reply).
+
+        Returns
+        -------
+        None.
+
+        """
+        print('WARNING: Counter query failed ({})'.format(error))
+        self.__isFault = True
+        self.resetInput()
+        count = self.__telemetry['turns'] if self.__telemetry != None else 0
+        self.__stopAfterAnomaly(count)
 
-        # Send command and print reply
-        reply = self.__sendWithReply(command)
-        print('... ' + reply)            
-        self.__threadLock.release()
+    # -------------------------------------------------------------------------
+
+    def __stopAfterAnomaly(self, count):
+        """
+        Disable the motor (without waiting long for the reply) and notify the callback.
+
+        Parameters
+        ----------
+        count : int
+            Latest known counter value.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__coilStalls += 1
+        try:
+            self.enableMotor(False, timeoutSec=self._supervisionTimeoutSec)
+        except TimeoutError:
+            print('WARNING: Arduino did not acknowledge disabling the motor')
+        if self.__stallCallback != None:
+            self.__stallCallback(count)
         
 # -----------------------------------------------------------------------------
 # Main (sample)
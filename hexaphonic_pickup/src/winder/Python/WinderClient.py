@@ -0,0 +1,369 @@
+"""
+Client of the winder daemon offering the motor control interface of WinderApp.
+
+@author: Marc Hensel
+@contact: http://www.haw-hamburg.de/marc-hensel
+@copyright: 2024
+@version: 2024.10.19
+@license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
+"""
+import time
+import threading
+from SharedState import SharedState
+from CommandQueue import CommandQueue
+from WinderDaemon import WinderDaemon
+
+class WinderClient():
+
+    # =========================================================================
+    # ========== Class constants ==============================================
+    # =========================================================================
+
+    # Maximum age of the daemon's state before the daemon is considered lost [s]
+    _staleTimeoutSec = 2.0
+
+    # =========================================================================
+    # ========== Constructor ==================================================
+    # =========================================================================
+
+    def __init__(self, name='pickup_winder', isController=False, watchPeriodSec=0.1):
+        """
+        Constructor.
+
+        Attaches to a running WinderDaemon. Reading the state is cheap and
+        does not communicate with the Arduino. Any number of clients can read
+        the state, but only one client at a time may send commands.
+
+        Raises
+        ------
+        RuntimeError
+            If another client is attached as controller.
+
+        Parameters
+        ----------
+        name : string, optional
+            Name of the daemon to attach to. (Default: 'pickup_winder')
+        isController : bool, optional
+            Attach to the command queue to control the motor. (Default: False)
+        watchPeriodSec : float, optional
+            Period to check the state for stalls, if a stall callback is set [s]. (Default: 0.1)
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__sharedState = SharedState(name + WinderDaemon._stateSuffix)
+        self.__commandQueue = None
+        if isController:
+            commandQueue = CommandQueue(name + WinderDaemon._commandSuffix)
+            if not commandQueue.claim():
+                commandQueue.close()
+                self.__sharedState.close()
+                raise RuntimeError('Another client controls winder daemon {}'.format(name))
+            self.__commandQueue = commandQueue
+        self.__watchPeriodSec = watchPeriodSec
+        self.__stallCallback = None
+        self.__watchThread = None
+        print('Attached to winder daemon {}'.format(name))
+
+    # -------------------------------------------------------------------------
+
+    def close(self):
+        """
+        Detach from the daemon (the daemon and Arduino keep running).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__stallCallback = None
+        if self.__watchThread != None:
+            self.__watchThread.join()
+            self.__watchThread = None
+        self.__sharedState.close()
+        if self.__commandQueue != None:
+            self.__commandQueue.close()
+
+    # =========================================================================
+    # ========== State ========================================================
+    # =========================================================================
+
+    def getState(self):
+        """
+        Get the latest state published by the daemon.
+
+        Returns
+        -------
+        dict
+            State with fields as defined in SharedState._fields, or None.
+
+        """
+        return self.__sharedState.read()
+
+    # -------------------------------------------------------------------------
+
+    def getRevCount(self):
+        """
+        Get the latest count of motor full revolutions.
+
+        Returns
+        -------
+        int
+            Full revolutions since start or last counter reset.
+
+        """
+        state = self.getState()
+        return state['turns'] if state != None else 0
+
+    # -------------------------------------------------------------------------
+
+    def getTelemetry(self):
+        """
+        Get the latest telemetry published by the daemon.
+
+        Returns
+        -------
+        dict
+            'sampleId' (daemon's heartbeat), 'turns', 'speedRevsPerSec'
+            (target speed [rps]), 'actualRevsPerSec' (speed estimated by stall
+            detection [rps]), 'isEnabled', 'isFault' (motor stopped after a
+            failed serial transaction or daemon lost), and 'isConnected'
+            (daemon running and state up to date), or None.
+
+        """
+        state = self.getState()
+        if state == None:
+            return None
+        isConnected = self.__isConnected(state)
+        return {
+            'sampleId': state['heartbeat'],
+            'turns': state['turns'],
+            'speedRevsPerSec': state['speedRevsPerSec'],
+            'actualRevsPerSec': state['actualRevsPerSec'] if isConnected else 0.0,
+            'isEnabled': state['isEnabled'] and isConnected,
+            'isFault': state['isFault'] or not isConnected,
+            'isConnected': isConnected
+        }
+
+    # -------------------------------------------------------------------------
+
+    def __isConnected(self, state):
+        """
+        Check whether the daemon is running and keeps publishing its state.
+
+        A daemon that has crashed does not mark its state as not running, but
+        stops updating the state's time.
+
+        Parameters
+        ----------
+        state : dict
+            State as returned by getState(), or None.
+
+        Returns
+        -------
+        bool
+            True if the state is up to date, else False.
+
+        """
+        if (state == None) or (not state['isRunning']):
+            return False
+        return (time.time() - state['time'] <= self._staleTimeoutSec)
+
+    # =========================================================================
+    # ========== Motor control ================================================
+    # =========================================================================
+
+    def enableMotor(self, isEnabled):
+        """
+        Enable or disable stepper motor.
+
+        Parameters
+        ----------
+        isEnabled : boolean
+            Enable stepper if True, else disable stepper.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__send(WinderDaemon._commands['enableMotor'], 1 if isEnabled else 0)
+
+    # -------------------------------------------------------------------------
+
+    def setDirection(self, isClockwise):
+        """
+        Set the turning direction of the stepper motor.
+
+        Parameters
+        ----------
+        isClockwise : boolean
+            Turn steppr clockwise if True, else counter-clockwise.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__send(WinderDaemon._commands['setDirection'], 1 if isClockwise else 0)
+
+    # -------------------------------------------------------------------------
+
+    def setSpeed(self, revsPerSec):
+        """ Set stepper motor speed.
+
+        Parameters
+        ----------
+        revsPerSec : int
+            Motor speed [revolutions/sec].
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__send(WinderDaemon._commands['setSpeedRevsPerSec'], revsPerSec)
+
+    # -------------------------------------------------------------------------
+
+    def resetRevCounter(self):
+        """
+        Reset the Arduino's step counter.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__send(WinderDaemon._commands['resetRevCounter'])
+
+    # -------------------------------------------------------------------------
+
+    def setCoilInfo(self, pickup, string):
+        """
+        Set the pickup and string the current coil is wound for.
+
+        Parameters
+        ----------
+        pickup : int
+            Number of the pickup.
+        string : int
+            Number of the string (1 = high E to 6 = low E).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__send(WinderDaemon._commands['setPickup'], pickup)
+        self.__send(WinderDaemon._commands['setString'], string)
+
+    # -------------------------------------------------------------------------
+
+    def shutdownDaemon(self):
+        """
+        Request the daemon to stop the motor and terminate.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__send(WinderDaemon._commands['shutdown'])
+
+    # -------------------------------------------------------------------------
+
+    def __send(self, command, value=0, timeoutSec=1.0):
+        """
+        Put a command into the daemon's command queue.
+
+        Parameters
+        ----------
+        command : string
+            Command char (see WinderDaemon._commands).
+        value : int, optional
+            Command argument. (Default: 0)
+        timeoutSec : float, optional
+            Maximum time to wait while the queue is full [s]. (Default: 1.0)
+
+        Returns
+        -------
+        bool
+            True if the command has been queued, else False.
+
+        """
+        if self.__commandQueue == None:
+            print('WARNING: Client is not attached as controller')
+            return False
+        if not self.__isConnected(self.getState()):
+            print('WARNING: Winder daemon not running, command {} dropped'.format(command))
+            return False
+
+        stopTime = time.monotonic() + timeoutSec
+        while not self.__commandQueue.put(command, value):
+            if time.monotonic() > stopTime:
+                print('WARNING: Command queue full, command {} dropped'.format(command))
+                return False
+            time.sleep(0.01)
+        return True
+
+    # =========================================================================
+    # ========== Stall detection ==============================================
+    # =========================================================================
+
+    def setStallCallback(self, callback):
+        """
+        Set a function to call after the daemon has stopped the motor due to a
+        stall or fault, or if the daemon is lost (i.e., its state is outdated).
+
+        Parameters
+        ----------
+        callback : function
+            Function taking the counter value at the stall as argument, or None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__stallCallback = callback
+        if (callback != None) and (self.__watchThread == None):
+            self.__watchThread = threading.Thread(target=self.__watchStall, daemon=True)
+            self.__watchThread.start()
+
+    # -------------------------------------------------------------------------
+
+    def __watchStall(self):
+        """
+        Thread method calling the stall callback when the state reports a new
+        stall or fault, or the daemon is lost.
+
+        Ends when the callback is set to None.
+
+        Returns
+        -------
+        None.
+
+        """
+        wasStalled = False
+        while self.__stallCallback != None:
+            state = self.getState()
+            isStalled = (not self.__isConnected(state)) or state['isStalled'] or state['isFault']
+            if isStalled and not wasStalled:
+                callback = self.__stallCallback
+                if callback != None:
+                    callback(state['turns'] if state != None else 0)
+            wasStalled = isStalled
+            time.sleep(self.__watchPeriodSec)
+
+# -----------------------------------------------------------------------------
+# Main (sample)
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    from WinderGUI import WinderGUI
+    client = WinderClient(isController=True)
+    WinderGUI(parentApp=client)
+    client.close()
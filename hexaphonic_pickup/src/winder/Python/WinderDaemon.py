@@ -0,0 +1,285 @@
+"""
+Hardware I/O process of the hexaphonic pickup winder.
+
+The daemon owns the serial connection to the Arduino and supervises the
+motor in a process of its own, so that GUIs, loggers, or scripts cannot delay
+serial communication. It publishes the winder's state in shared memory
+(SharedState) and receives commands from a shared memory queue
+(CommandQueue). Clients (see WinderClient) can attach and detach at any time
+without reconnecting to (and thereby resetting) the Arduino.
+
+@author: Marc Hensel
+@contact: http://www.haw-hamburg.de/marc-hensel
+@copyright: 2024
+@version: 2024.10.19
+@license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
+"""
+import time
+from WinderApp import WinderApp
+from SharedState import SharedState
+from CommandQueue import CommandQueue
+
+class WinderDaemon():
+
+    # =========================================================================
+    # ========== Class constants ==============================================
+    # =========================================================================
+
+    # Command chars expected in the command queue
+    _commands = {
+        'enableMotor':          'E',    # Value: 1 to enable, 0 to disable
+        'setDirection':         'D',    # Value: 1 for clockwise, 0 for counter-clockwise
+        'setSpeedRevsPerSec':   'S',    # Value: Speed [rps]
+        'resetRevCounter':      'R',
+        'setPickup':            'P',    # Value: Pickup number (logged with coils)
+        'setString':            'N',    # Value: String number (logged with coils)
+        'shutdown':             'Q'
+    }
+
+    # Names of the shared memory blocks (appended to daemon name)
+    _stateSuffix = '_state'
+    _commandSuffix = '_commands'
+
+    # =========================================================================
+    # ========== Constructor ==================================================
+    # =========================================================================
+
+    def __init__(self, serialCOM=None, name='pickup_winder', pollPeriodSec=0.2, idlePeriodSec=0.01):
+        """
+        Constructor.
+
+        Connects to the Arduino and creates the shared memory. Call run() to
+        start processing commands.
+
+        Parameters
+        ----------
+        serialCOM : int, optional
+            Serial port Arduino is connected to (e.g., '3' for 'COM3').
+            Tries to connect to ports 0 to 15, if argument is None. (Default: None)
+        name : string, optional
+            Name clients use to attach to the daemon. (Default: 'pickup_winder')
+        pollPeriodSec : float, optional
+            Period to query the counter and publish the state [s]. Stall
+            detection uses the counter values of the last 3 periods. (Default: 0.2)
+        idlePeriodSec : float, optional
+            Sleep time between checks for new commands [s]. (Default: 0.01)
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__pollPeriodSec = pollPeriodSec
+        self.__idlePeriodSec = idlePeriodSec
+        self.__isRunning = False
+        self.__pickup = 1
+        self.__string = 1
+
+        # Connect to Arduino (counter queried by this process' loop only)
+        self.__app = WinderApp(serialCOM=serialCOM, supervisionPeriodSec=None, stallWindowSec=3 * pollPeriodSec, isShowGUI=False)
+        self.__app.setStallCallback(self.__onStall)
+
+        # State published to clients
+        self.__state = {
+            'isRunning': True,
+            'turns': 0,
+            'speedRevsPerSec': 0.0,
+            'actualRevsPerSec': 0.0,
+            'isEnabled': False,
+            'isClockwise': True,
+            'isStalled': False,
+            'isFault': False,
+            'errorCount': 0
+        }
+        self.__sharedState = SharedState(name + self._stateSuffix, isCreate=True)
+        self.__commandQueue = CommandQueue(name + self._commandSuffix, isCreate=True)
+        self.__sharedState.write(self.__state)
+
+    # =========================================================================
+    # ========== Main loop ====================================================
+    # =========================================================================
+
+    def run(self):
+        """
+        Process commands and publish the state until a shutdown command or Ctrl+C.
+
+        Returns
+        -------
+        None.
+
+        """
+        print('Winder daemon running (stop with Ctrl+C)')
+        self.__isRunning = True
+        nextPollTime = time.monotonic()
+        try:
+            while self.__isRunning:
+                # Execute pending commands
+                isChanged = False
+                command = self.__commandQueue.get()
+                while command != None:
+                    self.__execute(*command)
+                    isChanged = True
+                    command = self.__commandQueue.get()
+
+                # Query counter periodically (feeds stall detection)
+                now = time.monotonic()
+                if now >= nextPollTime:
+                    nextPollTime = max(nextPollTime + self.__pollPeriodSec, now)
+                    self.__updateCounter()
+                    isChanged = True
+
+                if isChanged:
+                    self.__sharedState.write(self.__state)
+                time.sleep(self.__idlePeriodSec)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    # -------------------------------------------------------------------------
+
+    def close(self):
+        """
+        Stop the motor, close the serial connection, and remove the shared memory.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__app.close(waitTimeSec=0.0, timeoutSec=WinderApp._supervisionTimeoutSec)
+        self.__state.update(isRunning=False, isEnabled=False, speedRevsPerSec=0.0, actualRevsPerSec=0.0)
+        self.__sharedState.write(self.__state)
+        self.__sharedState.close()
+        self.__commandQueue.close()
+
+    # =========================================================================
+    # ========== Commands and supervision =====================================
+    # =========================================================================
+
+    def __execute(self, command, value):
+        """
+        Execute a command received from a client.
+
+        Waits for the Arduino's reply as briefly as the app's supervision, so
+        that a dead Arduino does not block the command loop. A missing reply
+        is handled as fault (see __onFault()).
+
+        Parameters
+        ----------
+        command : string
+            Command char (see _commands).
+        value : int
+            Command argument.
+
+        Returns
+        -------
+        None.
+
+        """
+        timeoutSec = WinderApp._supervisionTimeoutSec
+        try:
+            if command == self._commands['enableMotor']:
+                self.__app.enableMotor(value != 0, timeoutSec=timeoutSec)
+                self.__state.update(isEnabled=(value != 0), isStalled=False, isFault=False)
+            elif command == self._commands['setDirection']:
+                self.__app.setDirection(value != 0, timeoutSec=timeoutSec)
+                self.__state['isClockwise'] = (value != 0)
+            elif command == self._commands['setSpeedRevsPerSec']:
+                self.__app.setSpeed(value, timeoutSec=timeoutSec)
+                self.__state['speedRevsPerSec'] = float(value)
+            elif command == self._commands['resetRevCounter']:
+                self.__app.resetRevCounter(timeoutSec=timeoutSec)
+                self.__state['turns'] = 0
+            elif command == self._commands['setPickup']:
+                self.__pickup = value
+                self.__app.setCoilInfo(self.__pickup, self.__string)
+            elif command == self._commands['setString']:
+                self.__string = value
+                self.__app.setCoilInfo(self.__pickup, self.__string)
+            elif command == self._commands['shutdown']:
+                self.__isRunning = False
+            else:
+                print('WARNING: Unknown command {}'.format(command))
+        except TimeoutError as error:
+            self.__onFault('Command {} failed ({})'.format(command, error))
+        except Exception as error:
+            self.__state['errorCount'] += 1
+            print('WARNING: Command {} failed ({})'.format(command, error))
+
+    # -------------------------------------------------------------------------
+
+    def __updateCounter(self):
+        """
+        Query the counter and update the speed estimate.
+
+        Waits for the reply as briefly as the app's supervision, so that a
+        dead Arduino does not block the command loop.
+
+        Returns
+        -------
+        None.
+
+        """
+        try:
+            self.__state['turns'] = self.__app.getRevCount(timeoutSec=WinderApp._supervisionTimeoutSec)
+            actualRevsPerSec, _ = self.__app.getSpeeds()
+            self.__state['actualRevsPerSec'] = actualRevsPerSec if self.__state['isEnabled'] else 0.0
+        except (TimeoutError, ValueError) as error:
+            self.__onFault('Querying counter failed ({})'.format(error))
+
+    # -------------------------------------------------------------------------
+
+    def __onFault(self, message):
+        """
+        Count a failed serial transaction and disable the motor, if it is enabled.
+
+        Discards pending input (e.g., a late reply), so that later commands
+        and replies are in sync again. The fault is published in the state
+        until the motor is enabled again.
+
+        Parameters
+        ----------
+        message : string
+            Description of the failed transaction.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__state['errorCount'] += 1
+        if not self.__state['isFault']:
+            print('WARNING: ' + message)
+        self.__app.resetInput()
+        if self.__state['isEnabled']:
+            try:
+                self.__app.enableMotor(False, timeoutSec=WinderApp._supervisionTimeoutSec)
+            except TimeoutError:
+                print('WARNING: Arduino did not acknowledge disabling the motor')
+        self.__state.update(isEnabled=False, isFault=True, actualRevsPerSec=0.0)
+
+    # -------------------------------------------------------------------------
+
+    def __onStall(self, count):
+        """ App callback method after the motor has been stopped due to a stall.
+
+        Parameters
+        ----------
+        count : int
+            Counter value at the stall.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__state.update(turns=count, isEnabled=False, isStalled=True, actualRevsPerSec=0.0)
+
+# -----------------------------------------------------------------------------
+# Main (sample)
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    daemon = WinderDaemon()
+    daemon.run()
@@ -4,16 +4,24 @@ GUI of the control app for a hexaphonic pickup winder.
 @author: Marc Hensel
 @contact: http://www.haw-hamburg.de/marc-hensel
 @copyright: 2024
-@version: 2024.07.07
+@version: 2024.10.19
 @license: CC BY-NC-SA 4.0, see https://creativecommons.org/licenses/by-nc-sa/4.0/deed.en
 """
 import tkinter as tk
 import webbrowser
 import threading
 from PIL import ImageTk, Image
+from TelemetryPlot import TelemetryPlot
 
 class WinderGUI():
 
+    # =========================================================================
+    # ========== Class constants ==============================================
+    # =========================================================================
+
+    # Period to check the app for new telemetry [ms]
+    _telemetryPeriodMs = 100
+
     # =========================================================================
     # ========== Constructor ==================================================
     # =========================================================================
@@ -40,18 +48,29 @@ class WinderGUI():
         root.title('Pickup Winder')
         self.__bg_color =  root.cget('bg')
         self.__isCounterClockwiseValue = tk.BooleanVar()       # State of the checkbox "Rotate counter-clockwise"
+        self.__pickupValue = tk.IntVar(value=1)                # Pickup the coil is wound for
+        self.__stringValue = tk.IntVar(value=1)                # String the coil is wound for
+        self.__isShowCoilValue = tk.BooleanVar(value=True)     # State of the radio buttons "Coil"/"Session"
+        self.__lastTelemetryId = None                          # ID of the last telemetry sample added to the plot
+        self.__stallCount = None                               # Counter value of a reported stall not shown yet
 
         # Create left (counter, stepper, and info) and right (speed control) GUI frames
         leftFrame = tk.Frame(root)
         self.__addCounterFrame(parent=leftFrame, padding=10)
         self.__addStepperMotorFrame(parent=leftFrame, padding=10)
+        self.__addCoilFrame(parent=leftFrame, padding=10)
         self.__addInfoFrame(parent=leftFrame, padding=10)
         self.__addImage(parent=leftFrame, dy=16)        
         rightFrame = self.__createRightFrame(parent=root, padding=10)
+        plotFrame = self.__createPlotFrame(parent=root, padding=10)
 
         # Layout and start GUI loop
         leftFrame.pack(side='left', anchor='n', padx=5, pady=5)
         rightFrame.pack(side='left', padx=5, pady=5)
+        plotFrame.pack(side='left', fill='both', expand=True, padx=5, pady=5)
+        if self.parentApp != None:
+            self.parentApp.setStallCallback(self.__onStall)
+            root.after(self._telemetryPeriodMs, self.__onUpdateTelemetry, root)
         root.mainloop()
                 
     # -------------------------------------------------------------------------
@@ -107,6 +126,37 @@ class WinderGUI():
         
     # -------------------------------------------------------------------------
     
+    def __addCoilFrame(self, parent, padding):
+        """
+        Add a frame to select the pickup and string of the coil to wind (logged with the coil).
+
+        Parameters
+        ----------
+        parent : tkinter.Frame
+            GUI object to place created frame in.
+        padding : int
+            Space (padding) inside the frame boarder.
+
+        Returns
+        -------
+        None.
+
+        """
+        frame = tk.LabelFrame(parent, text='Coil', padx=padding, pady=padding)
+        pickupLabel = tk.Label(frame, text='Pickup')
+        pickupSpinbox = tk.Spinbox(frame, from_=1, to=999, width=4, textvariable=self.__pickupValue, command=self.__onSetCoilInfo)
+        stringLabel = tk.Label(frame, text='String')
+        stringSpinbox = tk.Spinbox(frame, from_=1, to=6, width=2, textvariable=self.__stringValue, state='readonly', command=self.__onSetCoilInfo)
+        pickupSpinbox.bind('<Return>', lambda e: self.__onSetCoilInfo())
+        pickupSpinbox.bind('<FocusOut>', lambda e: self.__onSetCoilInfo())
+        pickupLabel.pack(side='left')
+        pickupSpinbox.pack(side='left')
+        stringLabel.pack(side='left', padx=(10, 0))
+        stringSpinbox.pack(side='left')
+        frame.pack(side='top', anchor='w', fill='x')
+        
+    # -------------------------------------------------------------------------
+    
     def __addInfoFrame(self, parent, padding):
         """
         Add a frame containing a hyperlink to the project's GitHub repository.
@@ -178,10 +228,84 @@ class WinderGUI():
         self.__startStopButton.pack(fill='x')
         return frame
     
+    # -------------------------------------------------------------------------
+    
+    def __createPlotFrame(self, parent, padding):
+        """
+        Create a frame containing live plots of the speed and turns over time.
+
+        Parameters
+        ----------
+        parent : tkinter.Frame
+            GUI object to place created frame in.
+        padding : int
+            Space (padding) inside the frame boarder.
+
+        Returns
+        -------
+        tkinter.LabelFrame
+            Created frame.
+
+        """
+        frame = tk.LabelFrame(parent, text='Telemetry', padx=padding, pady=padding)
+        selectFrame = tk.Frame(frame)
+        coilButton = tk.Radiobutton(selectFrame, text='Coil', variable=self.__isShowCoilValue, value=True, command=self.__onSelectPlotRange)
+        sessionButton = tk.Radiobutton(selectFrame, text='Session', variable=self.__isShowCoilValue, value=False, command=self.__onSelectPlotRange)
+        coilButton.pack(side='left')
+        sessionButton.pack(side='left')
+        selectFrame.pack(side='top', anchor='w')
+        self.__plot = TelemetryPlot(parent=frame)
+        return frame
+
     # =========================================================================
     # ========== Callback methods =============================================
     # =========================================================================
 
+    def __onUpdateTelemetry(self, root):
+        """ Tk timer callback method adding new telemetry to the plot.
+
+        Reads the latest state of the app (i.e., the counter queries of the
+        stall detection or the state published by the daemon) without
+        querying the Arduino. Shows stalls reported by the app, as widgets
+        must only be changed in the Tk loop, and disables the start/stop
+        button while the app is not connected (e.g., the daemon is lost).
+
+        Parameters
+        ----------
+        root : tkinter.Tk
+            GUI root to schedule the next call with.
+
+        Returns
+        -------
+        None.
+
+        """
+        # Show stall reported by app (i.e., by another thread)
+        stallCount = self.__stallCount
+        if stallCount != None:
+            self.__stallCount = None
+            self.__startStopButton.config(text='Start', bg=self.__bg_color)
+            self.__counterLabel.config(text=str(stallCount), background='red')
+
+        # Refuse to start motor while not connected
+        telemetry = self.parentApp.getTelemetry()
+        isConnected = telemetry['isConnected'] if telemetry != None else True
+        buttonState = 'normal' if isConnected else 'disabled'
+        if self.__startStopButton.cget('state') != buttonState:
+            self.__startStopButton.config(state=buttonState)
+            if not isConnected:
+                self.__startStopButton.config(text='Start', bg=self.__bg_color)
+                self.__counterLabel.config(background='red')
+
+        # Add new telemetry to plot
+        if (telemetry != None) and (telemetry['sampleId'] != self.__lastTelemetryId):
+            self.__lastTelemetryId = telemetry['sampleId']
+            commandedRps = telemetry['speedRevsPerSec'] if telemetry['isEnabled'] else 0
+            self.__plot.addSample(commandedRps, telemetry['actualRevsPerSec'], telemetry['turns'])
+        root.after(self._telemetryPeriodMs, self.__onUpdateTelemetry, root)
+
+    # -------------------------------------------------------------------------
+
     def __onUpdateCounter(self):
         """ Time callback method to update the counter.
         
@@ -219,6 +343,7 @@ class WinderGUI():
         if self.parentApp != None:
             self.__counterLabel.config(text = '0')
             self.parentApp.resetRevCounter()
+            self.__plot.markCoilStart()
         else:
             print('Counter reset (no app connected)')
 
@@ -240,6 +365,25 @@ class WinderGUI():
 
     # -------------------------------------------------------------------------
     
+    def __onSetCoilInfo(self):
+        """ Spinbox callback method to set the pickup and string of the coil to wind.
+
+        Returns
+        -------
+        None.
+
+        """        
+        try:
+            pickup, string = self.__pickupValue.get(), self.__stringValue.get()
+        except tk.TclError:
+            return      # Pickup entry is not a number (yet)
+        if self.parentApp != None:
+            self.parentApp.setCoilInfo(pickup=pickup, string=string)
+        else:
+            print('Coil for pickup {}, string {} (no app connected)'.format(pickup, string))
+
+    # -------------------------------------------------------------------------
+    
     def __onStartStop(self):
         """ Button callback method to start/stop (i.e., enable/disable) the stepper motor.
         
@@ -255,6 +399,7 @@ class WinderGUI():
         # Toggle button text (start/stop)
         isStart = (self.__startStopButton.cget('text') == 'Start')
         if isStart == True:
+            self.__counterLabel.config(background='black')
             self.__startStopButton.config(text='Stop', bg='red')
         else:
             self.__startStopButton.config(text='Start', bg=self.__bg_color)
@@ -288,6 +433,39 @@ class WinderGUI():
 
     # -------------------------------------------------------------------------
     
+    def __onStall(self, count):
+        """ App callback method after the motor has been stopped due to a stall.
+
+        Called by the app's supervision thread. Only stores the counter
+        value, so that the Tk loop (see __onUpdateTelemetry()) resets the
+        start/stop button and highlights the counter display.
+
+        Parameters
+        ----------
+        count : int
+            Counter value at the stall.
+
+        Returns
+        -------
+        None.
+
+        """        
+        self.__stallCount = count
+
+    # -------------------------------------------------------------------------
+    
+    def __onSelectPlotRange(self):
+        """ Radio button callback method to plot the current coil or the whole session.
+
+        Returns
+        -------
+        None.
+
+        """        
+        self.__plot.setShowCoil(self.__isShowCoilValue.get())
+
+    # -------------------------------------------------------------------------
+    
     def __onLink(self, url):
         """ Hyperlink callback method to the GitHub page in a webbrowser.
 